@@ -101,8 +101,8 @@ class App extends Component {
   }
 
 
-  async getProducts(){
-    let response = await fetch('/api/products/', {
+  async getBootstrap(){
+    let response = await fetch('/api/bootstrap/', {
       headers: {
         'Accept': 'application/json',
         'Content-Type': 'application/json',
@@ -115,31 +115,13 @@ class App extends Component {
 
     let data = await response.json();
     this.setState({
-      products : data
-    });
-  }
-
-  async getBanners(){
-    let response = await fetch('/api/banners/', {
-      headers: {
-        'Accept': 'application/json',
-        'Content-Type': 'application/json',
-      }
-    });
-
-    if (!response.ok){
-      return;
-    }
-
-    let data = await response.json();
-    this.setState({
-      banners : data
+      products : data.products,
+      banners : data.banners,
     });
   }
 
   componentDidMount(){
-    this.getProducts();
-    this.getBanners();
+    this.getBootstrap();
   }
 
 
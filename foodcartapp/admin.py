@@ -9,8 +9,8 @@ from django.utils.http import url_has_allowed_host_and_scheme
 
 from geo.models import Location
 
-from .models import (Order, OrderItem, Product, ProductCategory, Restaurant,
-                     RestaurantMenuItem)
+from .models import (Banner, Order, OrderItem, Product, ProductCategory,
+                     Restaurant, RestaurantMenuItem)
 
 logger = logging.getLogger(__file__)
 
@@ -32,6 +32,9 @@ class RestaurantAdmin(admin.ModelAdmin):
         'address',
         'contact_phone',
     ]
+    readonly_fields = [
+        'location',
+    ]
     inlines = [
         RestaurantMenuItemInline
     ]
@@ -66,12 +69,14 @@ class ProductAdmin(admin.ModelAdmin):
         'name',
         'category',
         'price',
+        'is_available',
     ]
     list_display_links = [
         'name',
     ]
     list_filter = [
         'category',
+        'is_available',
     ]
     search_fields = [
         # FIXME SQLite can not convert letter case for cyrillic words properly,
@@ -119,9 +124,14 @@ class ProductAdmin(admin.ModelAdmin):
     def get_image_preview(self, obj):
         if not obj.image:
             return 'выберите картинку'
+        srcsets = obj.get_image_srcsets()
         return format_html(
-            '<img src="{url}" style="max-height: 200px;"/>',
-            url=obj.image.url
+            '<picture><source type="image/webp" srcset="{webp}" sizes="200px">'
+            '<img src="{url}" srcset="{jpeg}" sizes="200px"'
+            ' style="max-height: 200px;"/></picture>',
+            url=obj.image.url,
+            webp=srcsets.get('webp', obj.image.url),
+            jpeg=srcsets.get('jpeg', obj.image.url),
         )
     get_image_preview.short_description = 'превью'
 
@@ -132,7 +142,7 @@ class ProductAdmin(admin.ModelAdmin):
         return format_html(
             '<a href="{edit_url}"><img src="{src}" style="max-height: 50px;"/>\
                 </a>',
-            edit_url=edit_url, src=obj.image.url
+            edit_url=edit_url, src=obj.get_image_preview_url()
         )
     get_image_list_preview.short_description = 'превью'
 
@@ -142,6 +152,37 @@ class ProductCategoryAdmin(admin.ModelAdmin):
     pass
 
 
+@admin.register(Banner)
+class BannerAdmin(admin.ModelAdmin):
+    list_display = [
+        'get_image_list_preview',
+        'title',
+        'order',
+        'is_active',
+        'active_from',
+        'active_until',
+    ]
+    list_display_links = [
+        'title',
+    ]
+    list_editable = [
+        'order',
+        'is_active',
+    ]
+    list_filter = [
+        'is_active',
+    ]
+
+    def get_image_list_preview(self, obj):
+        if not obj.image:
+            return 'нет картинки'
+        return format_html(
+            '<img src="{src}" style="max-height: 50px;"/>',
+            src=obj.image.url
+        )
+    get_image_list_preview.short_description = 'превью'
+
+
 class OrderItemInline(admin.TabularInline):
     model = OrderItem
     extra = 0
@@ -156,9 +197,14 @@ class OrderAdmin(admin.ModelAdmin):
         'status',
         'payment_method',
         'comment',
+        'total_cost',
         'registered_at'
     )
-    readonly_fields = ('registered_at',)
+    readonly_fields = ('registered_at', 'total_cost', 'location',)
+
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        Order.objects.filter(id=form.instance.id).refresh_total_cost()
 
     def response_change(self, request, obj):
         try:
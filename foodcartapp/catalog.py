@@ -0,0 +1,359 @@
+import hashlib
+import json
+import time
+from datetime import datetime, timezone
+from functools import partial, wraps
+from math import ceil
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition
+
+from .models import Banner, Product, ProductCategory
+
+CATALOG_VERSION_KEY = 'foodcartapp:catalog:version'
+CATALOG_CHANGED_AT_KEY = 'foodcartapp:catalog:changed_at'
+SNAPSHOT_LOCK_TIMEOUT = 10
+SNAPSHOT_POLL_INTERVAL = 0.05
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+PRODUCT_FIELDS = [
+    'id',
+    'name',
+    'price',
+    'special_status',
+    'description',
+    'category',
+    'image',
+    'image_srcset',
+    'restaurant',
+]
+COMPACT_PRODUCT_FIELDS = [
+    field for field in PRODUCT_FIELDS if field != 'restaurant'
+]
+# Only the first pages of the unfiltered lists are cached: cursors, prices
+# and fields make unbounded number of variants
+CACHED_PRODUCTS_PARAMS = {'paginate', 'limit', 'compact'}
+CACHED_PRODUCTS_LIMITS = {DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE}
+
+
+def get_initial_catalog_version():
+    # Start from a timestamp, so a version evicted from the cache can not
+    # be reused by stale snapshots which are still stored.
+    return time.time_ns() // 1000
+
+
+def get_catalog_version():
+    version = cache.get(CATALOG_VERSION_KEY)
+    if version is not None:
+        return version
+
+    initial_version = get_initial_catalog_version()
+    cache.add(CATALOG_VERSION_KEY, initial_version, timeout=None)
+    return cache.get(CATALOG_VERSION_KEY, initial_version)
+
+
+def bump_catalog_version():
+    cache.set(CATALOG_CHANGED_AT_KEY, time.time(), timeout=None)
+    try:
+        return cache.incr(CATALOG_VERSION_KEY)
+    except ValueError:
+        version = get_initial_catalog_version()
+        cache.set(CATALOG_VERSION_KEY, version, timeout=None)
+        return version
+
+
+def get_catalog_changed_at():
+    changed_at = cache.get(CATALOG_CHANGED_AT_KEY)
+    if changed_at is None:
+        changed_at = time.time()
+        cache.add(CATALOG_CHANGED_AT_KEY, changed_at, timeout=None)
+        changed_at = cache.get(CATALOG_CHANGED_AT_KEY, changed_at)
+    return datetime.fromtimestamp(changed_at, tz=timezone.utc)
+
+
+def get_catalog_etag(request, *args, **kwargs):
+    query = request.GET.urlencode()
+    query_digest = hashlib.md5(query.encode()).hexdigest()[:8]
+    return f'{get_catalog_version()}-{query_digest}'
+
+
+def get_catalog_last_modified(request, *args, **kwargs):
+    return get_catalog_changed_at()
+
+
+def get_catalog_cache_control(request):
+    return {'public': True, 'no_cache': True}
+
+
+def catalog_condition(view=None, *, etag_func=get_catalog_etag,
+                      last_modified_func=get_catalog_last_modified,
+                      cache_control_func=get_catalog_cache_control):
+    """Answer conditional GET requests to a catalog view with 304.
+
+    ETag and Last-Modified are derived from the catalog version, so
+    a revalidation costs neither a database query nor serialization.
+    """
+    if view is None:
+        return partial(
+            catalog_condition,
+            etag_func=etag_func,
+            last_modified_func=last_modified_func,
+            cache_control_func=cache_control_func,
+        )
+
+    conditional_view = condition(
+        etag_func=etag_func,
+        last_modified_func=last_modified_func,
+    )(view)
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        response = conditional_view(request, *args, **kwargs)
+        patch_cache_control(response, **cache_control_func(request))
+        return response
+
+    return wrapper
+
+
+def get_snapshot(name, build, get_timeout=None):
+    """Return the payload `name` built for the current catalog version.
+
+    Only one process rebuilds a missing snapshot, the others wait for it
+    to appear in the cache and build it themselves only if the lock expires.
+    `get_timeout` may shorten the time the built payload is cached for.
+    """
+    version = get_catalog_version()
+    key = f'foodcartapp:catalog:{name}:{version}'
+    snapshot = cache.get(key)
+    if snapshot is not None:
+        return snapshot
+
+    lock_key = f'{key}:lock'
+    if cache.add(lock_key, True, timeout=SNAPSHOT_LOCK_TIMEOUT):
+        try:
+            snapshot = build()
+            timeout = settings.CATALOG_SNAPSHOT_TIMEOUT
+            if get_timeout:
+                timeout = get_timeout(snapshot)
+            cache.set(key, snapshot, timeout=timeout)
+        finally:
+            cache.delete(lock_key)
+        return snapshot
+
+    deadline = time.monotonic() + SNAPSHOT_LOCK_TIMEOUT
+    while time.monotonic() < deadline:
+        time.sleep(SNAPSHOT_POLL_INTERVAL)
+        snapshot = cache.get(key)
+        if snapshot is not None:
+            return snapshot
+
+    return build()
+
+
+def dump_json(payload):
+    return json.dumps(
+        payload,
+        cls=DjangoJSONEncoder,
+        ensure_ascii=False,
+        indent=4,
+    ).encode()
+
+
+def dump_compact_json(payload):
+    return json.dumps(
+        payload,
+        ensure_ascii=False,
+        separators=(',', ':'),
+    ).encode()
+
+
+def dump_compact_json_chunks(dumped_products, paginate, next_cursor):
+    """Encode products one by one, so the response can be streamed."""
+    encoder = json.JSONEncoder(ensure_ascii=False, separators=(',', ':'))
+    chunks = [b'[' if paginate is False else b'{"results":[']
+    for index, dumped_product in enumerate(dumped_products):
+        separator = b',' if index else b''
+        chunks.append(separator + encoder.encode(dumped_product).encode())
+    if paginate is False:
+        chunks.append(b']')
+    else:
+        chunks.append(
+            b'],"next_cursor":' + encoder.encode(next_cursor).encode() + b'}'
+        )
+    return chunks
+
+
+def serialize_product(product, fields=PRODUCT_FIELDS, compact=False):
+    dumped_product = {
+        'id': product.id,
+        'name': product.name,
+        'price': str(product.price) if compact else product.price,
+        'special_status': product.special_status,
+        'description': product.description,
+        'category': {
+            'id': product.category.id,
+            'name': product.category.name,
+        } if product.category else None,
+        'image': product.image.url,
+        'image_srcset': product.get_image_srcsets(),
+        'restaurant': {
+            'id': product.id,
+            'name': product.name,
+        }
+    }
+    return {field: dumped_product[field] for field in fields}
+
+
+def build_products_snapshot(paginate=None, cursor=None, limit=None,
+                            fields=None, compact=None, **filters):
+    products = (
+        Product.objects
+        .select_related('category')
+        .available()
+        .filter_catalog(**filters)
+    )
+    next_cursor = None
+    if paginate is not False:
+        limit = limit or DEFAULT_PAGE_SIZE
+        products = list(products.after_cursor(cursor, limit + 1))
+        if len(products) > limit:
+            next_cursor = products[limit - 1].id
+        products = products[:limit]
+
+    if not fields:
+        fields = COMPACT_PRODUCT_FIELDS if compact else PRODUCT_FIELDS
+    dumped_products = [
+        serialize_product(product, fields, compact) for product in products
+    ]
+    if compact:
+        return dump_compact_json_chunks(dumped_products, paginate, next_cursor)
+    if paginate is False:
+        return dump_json(dumped_products)
+    return dump_json({
+        'results': dumped_products,
+        'next_cursor': next_cursor,
+    })
+
+
+def is_cached_products_query(params):
+    return (
+        params.keys() <= CACHED_PRODUCTS_PARAMS
+        and params.get('limit', DEFAULT_PAGE_SIZE) in CACHED_PRODUCTS_LIMITS
+    )
+
+
+def get_products_snapshot(**params):
+    params = {name: value for name, value in params.items()
+              if value is not None}
+    if not is_cached_products_query(params):
+        return build_products_snapshot(**params)
+    name = 'products:' + urlencode(sorted(params.items()))
+    return get_snapshot(name, lambda: build_products_snapshot(**params))
+
+
+def serialize_banner(banner):
+    return {
+        'title': banner.title,
+        'src': banner.image.url,
+        'text': banner.text,
+    }
+
+
+def build_banners_snapshot():
+    now = datetime.now(tz=timezone.utc)
+    banners = Banner.objects.active(now)
+    content = dump_json([serialize_banner(banner) for banner in banners])
+    next_change_at = Banner.objects.get_next_change_at(now)
+    return make_expiring_snapshot(
+        content,
+        next_change_at.timestamp() if next_change_at else None,
+    )
+
+
+def make_expiring_snapshot(content, expires_at):
+    # Such snapshot may change without a catalog version bump,
+    # so its ETag is a hash of the content
+    return {
+        'content': content,
+        'etag': hashlib.md5(content).hexdigest(),
+        'expires_at': expires_at,
+    }
+
+
+def get_expiring_snapshot_timeout(snapshot):
+    if snapshot['expires_at'] is None:
+        return settings.CATALOG_SNAPSHOT_TIMEOUT
+    expires_in = ceil(snapshot['expires_at'] - time.time())
+    return max(1, min(expires_in, settings.CATALOG_SNAPSHOT_TIMEOUT))
+
+
+def get_banners_snapshot():
+    return get_snapshot(
+        'banners',
+        build_banners_snapshot,
+        get_expiring_snapshot_timeout,
+    )
+
+
+def get_banners_etag(request, *args, **kwargs):
+    return get_banners_snapshot()['etag']
+
+
+def get_banners_cache_control(request):
+    """Let clients keep banners requested with the current version long.
+
+    A request with ?v=<catalog version> can not get outdated data,
+    until the active window of a banner opens or closes.
+    """
+    if request.GET.get('v') != str(get_catalog_version()):
+        return get_catalog_cache_control(request)
+
+    max_age = settings.BANNERS_MAX_AGE
+    expires_at = get_banners_snapshot()['expires_at']
+    if expires_at is not None:
+        max_age = max(0, min(max_age, int(expires_at - time.time())))
+    return {'public': True, 'max_age': max_age}
+
+
+def build_categories_snapshot():
+    categories = ProductCategory.objects.order_by('name')
+    return dump_compact_json([
+        {'id': category.id, 'name': category.name}
+        for category in categories
+    ])
+
+
+def get_categories_snapshot():
+    return get_snapshot('categories', build_categories_snapshot)
+
+
+def build_bootstrap_snapshot():
+    """Join the storefront snapshots into one payload."""
+    products = get_products_snapshot(paginate=False, compact=True)
+    banners = get_banners_snapshot()
+    content = b''.join([
+        b'{"products":',
+        *products,
+        b',"categories":',
+        get_categories_snapshot(),
+        b',"banners":',
+        banners['content'],
+        b'}',
+    ])
+    return make_expiring_snapshot(content, banners['expires_at'])
+
+
+def get_bootstrap_snapshot():
+    return get_snapshot(
+        'bootstrap',
+        build_bootstrap_snapshot,
+        get_expiring_snapshot_timeout,
+    )
+
+
+def get_bootstrap_etag(request, *args, **kwargs):
+    return get_bootstrap_snapshot()['etag']
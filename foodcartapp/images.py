@@ -0,0 +1,94 @@
+import hashlib
+import os
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+IMAGE_WIDTHS = [160, 320, 640]
+IMAGE_FORMATS = {
+    'webp': 'WEBP',
+    'jpeg': 'JPEG',
+}
+IMAGE_QUALITY = 80
+# Errors of reading a missing or broken image
+IMAGE_ERRORS = (OSError, UnidentifiedImageError)
+
+
+def get_file_hash(file):
+    file.open('rb')
+    file.seek(0)
+    file_hash = hashlib.sha256()
+    for chunk in file.chunks():
+        file_hash.update(chunk)
+    file.seek(0)
+    return file_hash.hexdigest()
+
+
+def get_derivative_widths(original_width):
+    widths = [width for width in IMAGE_WIDTHS if width < original_width]
+    return widths or [original_width]
+
+
+def delete_image_derivatives(storage, derivatives):
+    for image_format in IMAGE_FORMATS:
+        for name in derivatives.get(image_format, {}).values():
+            storage.delete(name)
+
+
+def make_image_derivatives(image, previous_derivatives=None):
+    """Save resized WebP and JPEG copies next to the image.
+
+    Returns the map stored in Product.image_derivatives: names of
+    the copies by format and width plus the name and the hash of the source.
+    Raises OSError if the image is missing or can not be decoded.
+    """
+    derivatives = {
+        'source': image.name,
+        'sha256': get_file_hash(image),
+    }
+    stem, _ = os.path.splitext(image.name)
+    with Image.open(image) as original:
+        picture = ImageOps.exif_transpose(original).convert('RGB')
+
+    # The image is read already, so a broken one keeps the previous copies
+    if previous_derivatives:
+        delete_image_derivatives(image.storage, previous_derivatives)
+
+    for image_format, pillow_format in IMAGE_FORMATS.items():
+        derivatives[image_format] = {}
+        for width in get_derivative_widths(picture.width):
+            height = round(picture.height * width / picture.width)
+            resized_picture = picture.resize((width, height), Image.LANCZOS)
+            buffer = BytesIO()
+            resized_picture.save(
+                buffer,
+                pillow_format,
+                quality=IMAGE_QUALITY,
+                optimize=True,
+            )
+            derivatives[image_format][str(width)] = image.storage.save(
+                f'{stem}_{width}w.{image_format}',
+                ContentFile(buffer.getvalue()),
+            )
+    return derivatives
+
+
+def get_image_srcsets(image, derivatives):
+    """Return srcset strings by image format, e.g. {'webp': 'a.webp 160w'}."""
+    return {
+        image_format: ', '.join(
+            f'{image.storage.url(name)} {width}w'
+            for width, name in derivatives.get(image_format, {}).items()
+        )
+        for image_format in IMAGE_FORMATS
+        if derivatives.get(image_format)
+    }
+
+
+def get_smallest_image_url(image, derivatives, image_format='jpeg'):
+    sizes = derivatives.get(image_format)
+    if not sizes:
+        return image.url
+    smallest_width = min(sizes, key=int)
+    return image.storage.url(sizes[smallest_width])
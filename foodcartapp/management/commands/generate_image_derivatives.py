@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand
+
+from foodcartapp.images import IMAGE_ERRORS
+from foodcartapp.models import Product
+from foodcartapp.signals import catalog_update_deferred
+
+
+class Command(BaseCommand):
+    help = 'Generates resized copies of the product images'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='regenerate the copies which already exist',
+        )
+
+    def handle(self, *args, **options):
+        generated = 0
+        failed = 0
+        with catalog_update_deferred():
+            for product in Product.objects.exclude(image='').iterator():
+                if product.image_derivatives and not options['force']:
+                    continue
+                try:
+                    product.refresh_image_derivatives()
+                except IMAGE_ERRORS as error:
+                    failed += 1
+                    self.stderr.write(
+                        f'{product.id} {product.image.name}: {error}'
+                    )
+                    continue
+                product.save(update_fields=['image_derivatives'])
+                generated += 1
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Image copies are generated for {generated} products'
+        ))
+        if failed:
+            self.stdout.write(self.style.WARNING(
+                f'{failed} images are missing or broken, they are skipped'
+            ))
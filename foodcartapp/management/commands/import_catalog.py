@@ -0,0 +1,352 @@
+import csv
+import json
+import os
+import time
+from collections import defaultdict
+from decimal import Decimal, InvalidOperation
+
+from django.core.files import File
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from foodcartapp.images import (IMAGE_ERRORS, delete_image_derivatives,
+                                get_file_hash, make_image_derivatives)
+from foodcartapp.models import (Product, ProductCategory, Restaurant,
+                                RestaurantMenuItem)
+from foodcartapp.signals import catalog_update_deferred
+
+TRUE_VALUES = {'1', 'true', 'yes', 'y', 'да', '+'}
+
+
+def parse_bool(value):
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in TRUE_VALUES
+
+
+def read_rows(path, file_format):
+    with open(path, encoding='utf-8') as file:
+        if file_format == 'csv':
+            yield from csv.DictReader(file)
+            return
+
+        for line in file:
+            if line.strip():
+                yield json.loads(line)
+
+
+def chunked(items, size):
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+class Command(BaseCommand):
+    help = 'Imports categories, products and restaurant menus from CSV/JSONL'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path',
+            help='a file with one menu row per line: product, price, '
+                 'category, image, special_status, description, '
+                 'restaurant, availability',
+        )
+        parser.add_argument(
+            '--format',
+            choices=['csv', 'jsonl'],
+            help='the file format, guessed from the extension by default',
+        )
+        parser.add_argument(
+            '--images-dir',
+            default='.',
+            help='a directory the image paths are relative to',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='how many rows are written in one transaction',
+        )
+
+    def handle(self, *args, **options):
+        started_at = time.monotonic()
+        path = options['path']
+        file_format = options['format'] or (
+            'jsonl' if path.endswith(('.jsonl', '.json')) else 'csv'
+        )
+        self.images_dir = options['images_dir']
+        self.batch_size = options['batch_size']
+
+        products_rows, menu_rows, rows_count = self.collect_rows(
+            read_rows(path, file_format)
+        )
+
+        with catalog_update_deferred():
+            categories = self.import_categories(products_rows)
+            products = self.import_products(products_rows, categories)
+            self.import_menu_items(menu_rows, products)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{rows_count} rows are imported '
+            f'in {time.monotonic() - started_at:.1f} s'
+        ))
+
+    def collect_rows(self, rows):
+        products_rows = {}
+        menu_rows = {}
+        rows_count = 0
+        for line_number, row in enumerate(rows, start=1):
+            rows_count += 1
+            name = (row.get('product') or '').strip()
+            if not name:
+                raise CommandError(f'Row {line_number}: no product name')
+
+            product_row = products_rows.setdefault(name, {})
+            if row.get('price') not in (None, ''):
+                try:
+                    product_row['price'] = Decimal(str(row['price']))
+                except InvalidOperation:
+                    raise CommandError(
+                        f'Row {line_number}: wrong price {row["price"]}'
+                    )
+            if row.get('category') is not None:
+                product_row['category'] = row['category'].strip() or None
+            if row.get('special_status') not in (None, ''):
+                product_row['special_status'] = parse_bool(
+                    row['special_status']
+                )
+            if row.get('description') is not None:
+                product_row['description'] = row['description']
+            if row.get('image'):
+                product_row['image'] = row['image']
+
+            restaurant = (row.get('restaurant') or '').strip()
+            if restaurant:
+                availability = row.get('availability')
+                menu_rows[(restaurant, name)] = (
+                    True if availability in (None, '')
+                    else parse_bool(availability)
+                )
+
+        return products_rows, menu_rows, rows_count
+
+    def import_categories(self, products_rows):
+        categories = {
+            category.name: category
+            for category in ProductCategory.objects.all()
+        }
+        new_categories = [
+            ProductCategory(name=name)
+            for name in {row.get('category') for row in products_rows.values()}
+            if name and name not in categories
+        ]
+        with transaction.atomic():
+            ProductCategory.objects.bulk_create(new_categories)
+
+        categories = {
+            category.name: category
+            for category in ProductCategory.objects.all()
+        }
+        self.stdout.write(f'Categories: {len(new_categories)} created')
+        return categories
+
+    def get_image_full_path(self, image_path):
+        full_path = os.path.join(self.images_dir, image_path)
+        if not os.path.isfile(full_path):
+            raise CommandError(f'Image {full_path} is not found')
+        return full_path
+
+    def get_image_file(self, image_path):
+        full_path = self.get_image_full_path(image_path)
+        return File(open(full_path, 'rb'), name=os.path.basename(full_path))
+
+    @staticmethod
+    def get_stored_image_hash(product):
+        if not product.image:
+            return None
+        if product.image_derivatives.get('sha256'):
+            return product.image_derivatives['sha256']
+        # Products saved before the copies were made have no hash recorded
+        try:
+            with product.image:
+                return get_file_hash(product.image)
+        except IMAGE_ERRORS:
+            return None
+
+    def is_new_image(self, product, image_path):
+        """Check the image is found and differs from the product one."""
+        with self.get_image_file(image_path) as image_file:
+            image_hash = get_file_hash(image_file)
+        return image_hash != self.get_stored_image_hash(product)
+
+    def upload_images(self, products_images):
+        """Save the images and their copies for the (product, path) pairs.
+
+        Returns the copies of the replaced images, they are deleted once
+        the products are saved. If an image is broken, the files saved so
+        far are deleted, so nothing is left to the rows not written.
+        """
+        replaced_derivatives = []
+        uploaded_products = []
+        try:
+            for product, image_path in products_images:
+                if product.image_derivatives:
+                    replaced_derivatives.append(product.image_derivatives)
+                product.image_derivatives = {}
+                with self.get_image_file(image_path) as image_file:
+                    product.image.save(image_file.name, image_file, save=False)
+                uploaded_products.append(product)
+                product.image_derivatives = make_image_derivatives(
+                    product.image
+                )
+        except IMAGE_ERRORS as error:
+            for product in uploaded_products:
+                delete_image_derivatives(
+                    product.image.storage,
+                    product.image_derivatives,
+                )
+                product.image.storage.delete(product.image.name)
+            raise CommandError(f'Image {image_path} is broken: {error}')
+        return replaced_derivatives
+
+    @staticmethod
+    def is_changed(product, field, value):
+        if field == 'category':
+            # Compare ids, not to fetch every category
+            return product.category_id != getattr(value, 'id', None)
+        return getattr(product, field) != value
+
+    def import_products(self, products_rows, categories):
+        products = {}
+        for product in Product.objects.order_by('-id'):
+            products[product.name] = product
+
+        new_products = []
+        # Products with equal new values are changed with one plain UPDATE,
+        # which is much cheaper than a CASE built by bulk_update
+        changes = defaultdict(list)
+        products_with_new_images = []
+        products_images = []
+        for name, row in products_rows.items():
+            values = dict(row)
+            if 'category' in values:
+                values['category'] = categories.get(values['category'])
+            image_path = values.pop('image', None)
+
+            product = products.get(name)
+            if not product:
+                if 'price' not in values or not image_path:
+                    raise CommandError(
+                        f'New product {name} needs a price and an image'
+                    )
+                product = Product(name=name, **values)
+                self.get_image_full_path(image_path)
+                products_images.append((product, image_path))
+                new_products.append(product)
+                continue
+
+            changed_values = tuple(sorted(
+                (field, value) for field, value in values.items()
+                if self.is_changed(product, field, value)
+            ))
+            if changed_values:
+                changes[changed_values].append(product.id)
+            if image_path and self.is_new_image(product, image_path):
+                products_images.append((product, image_path))
+                products_with_new_images.append(product)
+
+        # The files are saved only when all the rows are valid
+        replaced_derivatives = self.upload_images(products_images)
+
+        for batch in chunked(new_products, self.batch_size):
+            with transaction.atomic():
+                Product.objects.bulk_create(batch)
+        for changed_values, products_ids in changes.items():
+            for batch in chunked(products_ids, self.batch_size):
+                with transaction.atomic():
+                    Product.objects.filter(id__in=batch).update(
+                        **dict(changed_values)
+                    )
+        for batch in chunked(products_with_new_images, self.batch_size):
+            with transaction.atomic():
+                Product.objects.bulk_update(
+                    batch,
+                    ['image', 'image_derivatives'],
+                )
+        for derivatives in replaced_derivatives:
+            delete_image_derivatives(
+                Product.image.field.storage,
+                derivatives,
+            )
+
+        changed_products_count = len(
+            set().union(*changes.values())
+            | {product.id for product in products_with_new_images}
+        )
+        self.stdout.write(
+            f'Products: {len(new_products)} created, '
+            f'{changed_products_count} updated'
+        )
+        return {
+            product.name: product
+            for product in Product.objects.filter(name__in=products_rows)
+            .order_by('-id')
+        }
+
+    def import_menu_items(self, menu_rows, products):
+        restaurants = {
+            restaurant.name: restaurant
+            for restaurant in Restaurant.objects.all()
+        }
+        new_restaurants = [
+            Restaurant(name=name)
+            for name in {restaurant for restaurant, _ in menu_rows}
+            if name not in restaurants
+        ]
+        with transaction.atomic():
+            Restaurant.objects.bulk_create(new_restaurants)
+        restaurants = {
+            restaurant.name: restaurant
+            for restaurant in Restaurant.objects.all()
+        }
+
+        menu_items = {
+            (restaurant_id, product_id): (menu_item_id, availability)
+            for menu_item_id, restaurant_id, product_id, availability
+            in RestaurantMenuItem.objects.filter(
+                product__in=products.values()
+            ).values_list('id', 'restaurant', 'product', 'availability')
+        }
+        new_menu_items = []
+        changed_menu_items = defaultdict(list)
+        for (restaurant_name, product_name), availability in menu_rows.items():
+            restaurant = restaurants[restaurant_name]
+            product = products[product_name]
+            menu_item = menu_items.get((restaurant.id, product.id))
+            if not menu_item:
+                new_menu_items.append(RestaurantMenuItem(
+                    restaurant=restaurant,
+                    product=product,
+                    availability=availability,
+                ))
+                continue
+
+            menu_item_id, current_availability = menu_item
+            if current_availability != availability:
+                changed_menu_items[availability].append(menu_item_id)
+
+        for batch in chunked(new_menu_items, self.batch_size):
+            with transaction.atomic():
+                RestaurantMenuItem.objects.bulk_create(batch)
+        for availability, menu_items_ids in changed_menu_items.items():
+            for batch in chunked(menu_items_ids, self.batch_size):
+                with transaction.atomic():
+                    RestaurantMenuItem.objects.filter(id__in=batch).update(
+                        availability=availability
+                    )
+
+        self.stdout.write(
+            f'Restaurants: {len(new_restaurants)} created. '
+            f'Menu items: {len(new_menu_items)} created, '
+            f'{sum(map(len, changed_menu_items.values()))} updated'
+        )
@@ -0,0 +1,24 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from foodcartapp.publisher import publish_catalog
+
+
+class Command(BaseCommand):
+    help = 'Writes the catalog payloads to files served directly by nginx'
+
+    def handle(self, *args, **options):
+        if not settings.CATALOG_PUBLISH_ROOT:
+            raise CommandError('CATALOG_PUBLISH_ROOT is not set')
+
+        version = publish_catalog()
+        if version is None:
+            self.stdout.write(self.style.WARNING(
+                'The catalog changed while it was published, the newer '
+                'version is published by the process which changed it'
+            ))
+            return
+        self.stdout.write(self.style.SUCCESS(
+            f'Catalog version {version} is published to '
+            f'{settings.CATALOG_PUBLISH_ROOT}'
+        ))
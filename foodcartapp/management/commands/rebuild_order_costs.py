@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import F
+
+from foodcartapp.models import Order
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds Order.total_cost from the order items'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify',
+            action='store_true',
+            help='only report orders with a wrong cost, change nothing',
+        )
+
+    def handle(self, *args, **options):
+        if options['verify']:
+            mismatches = self.get_mismatches()
+            for order in mismatches:
+                self.stdout.write(
+                    f'{order.id}: total_cost={order.total_cost}, '
+                    f'expected {order.actual_cost}'
+                )
+            if mismatches:
+                raise CommandError(
+                    f'{len(mismatches)} orders have a wrong cost'
+                )
+            self.stdout.write(self.style.SUCCESS('Order costs are correct'))
+            return
+
+        updated = Order.objects.refresh_total_cost()
+
+        mismatches = self.get_mismatches()
+        if mismatches:
+            raise CommandError(
+                f'{len(mismatches)} orders still have a wrong cost'
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'Costs of {updated} orders are rebuilt'
+        ))
+
+    @staticmethod
+    def get_mismatches():
+        return list(
+            Order.objects.annotate_actual_cost()
+            .exclude(total_cost=F('actual_cost'))
+            .order_by('id')
+        )
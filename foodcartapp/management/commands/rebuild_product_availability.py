@@ -0,0 +1,54 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import F
+
+from foodcartapp.models import Product
+from foodcartapp.signals import schedule_catalog_update
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds Product.is_available from the restaurant menus'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify',
+            action='store_true',
+            help='only report products with a wrong flag, change nothing',
+        )
+
+    def handle(self, *args, **options):
+        if options['verify']:
+            mismatches = self.get_mismatches()
+            for product in mismatches:
+                self.stdout.write(
+                    f'{product.id} {product.name}: '
+                    f'is_available={product.is_available}, '
+                    f'expected {product.actual_availability}'
+                )
+            if mismatches:
+                raise CommandError(
+                    f'{len(mismatches)} products have a wrong availability'
+                )
+            self.stdout.write(self.style.SUCCESS('Availability is correct'))
+            return
+
+        with transaction.atomic():
+            updated = Product.objects.refresh_availability()
+            schedule_catalog_update()
+
+        mismatches = self.get_mismatches()
+        if mismatches:
+            raise CommandError(
+                f'{len(mismatches)} products still have a wrong availability'
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'Availability of {updated} products is rebuilt'
+        ))
+
+    @staticmethod
+    def get_mismatches():
+        return list(
+            Product.objects.annotate_actual_availability()
+            .exclude(is_available=F('actual_availability'))
+            .order_by('id')
+        )
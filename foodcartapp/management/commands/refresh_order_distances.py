@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+
+from foodcartapp.models import Order, OrderRestaurantDistance, Restaurant
+
+
+class Command(BaseCommand):
+    help = 'Saves the distances of unfinished orders to the restaurants'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='recalculate the saved distances too, not only the missing',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='how many orders are refreshed with one distance matrix',
+        )
+
+    def handle(self, *args, **options):
+        if options['all']:
+            orders = Order.objects.exclude(status=Order.COMPLETED)
+        else:
+            orders = OrderRestaurantDistance.objects.get_missing_orders()
+        orders_ids = list(orders.order_by('id').values_list('id', flat=True))
+
+        saved = 0
+        batch_size = options['batch_size']
+        for start in range(0, len(orders_ids), batch_size):
+            saved += len(OrderRestaurantDistance.objects.refresh(
+                Order.objects.filter(
+                    id__in=orders_ids[start:start + batch_size]
+                ),
+                Restaurant.objects.all(),
+            ))
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{saved} distances of {len(orders_ids)} orders are saved'
+        ))
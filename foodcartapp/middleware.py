@@ -0,0 +1,113 @@
+import asyncio
+import threading
+
+from django.conf import settings
+from django.http import JsonResponse
+from django.utils.decorators import sync_and_async_middleware
+from rest_framework import status
+
+from star_burger import metrics
+
+metrics.register(
+    'orders_in_flight',
+    'gauge',
+    'Order requests being processed by the worker',
+)
+metrics.register(
+    'orders_in_flight_limit',
+    'gauge',
+    'ORDERS_MAX_IN_FLIGHT of the worker',
+)
+metrics.register(
+    'orders_admitted_total',
+    'counter',
+    'Order requests let through by the admission control',
+)
+metrics.register(
+    'orders_rejected_total',
+    'counter',
+    'Order requests rejected with 503 by the admission control',
+)
+for metric_name in ['orders_admitted_total', 'orders_rejected_total']:
+    metrics.set_value(metric_name, 0)
+
+
+class AdmissionGate:
+    """A bounded counter of requests a worker processes at once."""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.in_flight = 0
+        self.lock = threading.Lock()
+        metrics.set_value('orders_in_flight', 0)
+        metrics.set_value('orders_in_flight_limit', limit)
+
+    def enter(self):
+        with self.lock:
+            if self.in_flight >= self.limit:
+                admitted = False
+            else:
+                self.in_flight += 1
+                admitted = True
+            in_flight = self.in_flight
+        metrics.set_value('orders_in_flight', in_flight)
+        if admitted:
+            metrics.inc('orders_admitted_total')
+        else:
+            metrics.inc('orders_rejected_total')
+        return admitted
+
+    def leave(self):
+        with self.lock:
+            self.in_flight -= 1
+            in_flight = self.in_flight
+        metrics.set_value('orders_in_flight', in_flight)
+
+
+def is_admission_controlled(request):
+    return (
+        request.method == 'POST'
+        and request.path in settings.ORDERS_ADMISSION_PATHS
+    )
+
+
+def get_rejection_response():
+    return JsonResponse(
+        {'error': 'Слишком много заказов, повторите попытку позже'},
+        status=status.HTTP_503_SERVICE_UNAVAILABLE,
+        headers={'Retry-After': str(settings.ORDERS_RETRY_AFTER)},
+        json_dumps_params={'ensure_ascii': False},
+    )
+
+
+@sync_and_async_middleware
+def order_admission_middleware(get_response):
+    """Reject order requests with 503 while the worker is saturated.
+
+    Waiting requests would only hold nginx connections until they time
+    out, a fast rejection lets clients retry when the peak is over.
+    """
+    gate = AdmissionGate(settings.ORDERS_MAX_IN_FLIGHT)
+
+    if asyncio.iscoroutinefunction(get_response):
+        async def middleware(request):
+            if not is_admission_controlled(request):
+                return await get_response(request)
+            if not gate.enter():
+                return get_rejection_response()
+            try:
+                return await get_response(request)
+            finally:
+                gate.leave()
+    else:
+        def middleware(request):
+            if not is_admission_controlled(request):
+                return get_response(request)
+            if not gate.enter():
+                return get_rejection_response()
+            try:
+                return get_response(request)
+            finally:
+                gate.leave()
+
+    return middleware
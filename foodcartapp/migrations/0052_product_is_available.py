@@ -0,0 +1,58 @@
+# Generated by Django 4.1.5 on 2026-10-18 09:01
+
+from django.db import migrations, models
+from django.db.models import Exists, OuterRef
+
+
+def fill_is_available(apps, schema_editor):
+    Product = apps.get_model('foodcartapp', 'Product')
+    RestaurantMenuItem = apps.get_model('foodcartapp', 'RestaurantMenuItem')
+    available_menu_items = RestaurantMenuItem.objects.filter(
+        product=OuterRef('pk'),
+        availability=True,
+    )
+    Product.objects.update(is_available=Exists(available_menu_items))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodcartapp', '0051_product_catalog_indexes'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='product',
+            name='product_category_id_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='product',
+            name='product_special_status_id_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='product',
+            name='product_price_id_idx',
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='is_available',
+            field=models.BooleanField(default=False, editable=False, help_text='хотя бы в одном ресторане, обновляется автоматически', verbose_name='есть в продаже'),
+        ),
+        migrations.RunPython(fill_is_available, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['is_available', 'id'], name='product_available_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['is_available', 'category', 'id'], name='product_category_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['is_available', 'special_status', 'id'], name='product_special_status_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['is_available', 'price', 'id'], name='product_price_id_idx'),
+        ),
+    ]
@@ -0,0 +1,71 @@
+# Generated by Django 4.1.5 on 2026-10-18 09:05
+
+from django.contrib.staticfiles import finders
+from django.core.files import File
+from django.db import migrations
+
+BANNERS = [
+    {
+        'title': 'Burger',
+        'image': 'burger.jpg',
+        'text': 'Tasty Burger at your doorstep',
+    },
+    {
+        'title': 'Spices',
+        'image': 'food.jpg',
+        'text': 'All Cuisines',
+    },
+    {
+        'title': 'New York',
+        'image': 'tasty.jpg',
+        'text': 'Food is incomplete without a tasty dessert',
+    },
+]
+
+
+def fill_banners(apps, schema_editor):
+    Banner = apps.get_model('foodcartapp', 'Banner')
+    for order, banner_fields in enumerate(BANNERS):
+        image_path = finders.find(banner_fields['image'])
+        if not image_path:
+            continue
+
+        banner = Banner(
+            title=banner_fields['title'],
+            text=banner_fields['text'],
+            order=order,
+        )
+        # The image copied by a previous run, for example for another
+        # test database, is reused
+        image_name = banner.image.field.generate_filename(
+            banner,
+            banner_fields['image'],
+        )
+        if banner.image.storage.exists(image_name):
+            banner.image.name = image_name
+        else:
+            with open(image_path, 'rb') as image_file:
+                banner.image.save(
+                    banner_fields['image'],
+                    File(image_file),
+                    save=False,
+                )
+        banner.save()
+
+
+def remove_banners(apps, schema_editor):
+    Banner = apps.get_model('foodcartapp', 'Banner')
+    Banner.objects.filter(
+        title__in=[banner_fields['title'] for banner_fields in BANNERS]
+    ).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodcartapp', '0054_add_banner'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_banners, remove_banners)
+    ]
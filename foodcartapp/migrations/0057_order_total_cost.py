@@ -0,0 +1,38 @@
+# Generated by Django 4.1.5 on 2026-10-18 09:24
+
+import django.core.validators
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def fill_total_cost(apps, schema_editor):
+    Order = apps.get_model('foodcartapp', 'Order')
+    OrderItem = apps.get_model('foodcartapp', 'OrderItem')
+    items_cost = OrderItem.objects.filter(order=OuterRef('pk'))\
+        .values('order')\
+        .annotate(cost=Sum(F('quantity') * F('price')))\
+        .values('cost')
+    Order.objects.update(total_cost=Coalesce(
+        Subquery(items_cost),
+        Value(Decimal(0)),
+        output_field=models.DecimalField(max_digits=10, decimal_places=2),
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodcartapp', '0056_add_idempotencykey'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='total_cost',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, help_text='сумма элементов заказа, обновляется автоматически', max_digits=10, validators=[django.core.validators.MinValueValidator(0)], verbose_name='стоимость'),
+        ),
+        migrations.RunPython(fill_total_cost, migrations.RunPython.noop),
+    ]
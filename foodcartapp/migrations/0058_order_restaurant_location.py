@@ -0,0 +1,39 @@
+# Generated by Django 4.1.5 on 2026-10-18 13:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def link_locations(apps, schema_editor):
+    # Only exact matches are linked: other spellings get their own locations
+    # and links from the geocode_backfill command
+    Location = apps.get_model('geo', 'Location')
+    for model_name in ['Order', 'Restaurant']:
+        model = apps.get_model('foodcartapp', model_name)
+        model.objects.update(location=Subquery(
+            Location.objects.filter(address=OuterRef('address'))
+            .values('id')[:1]
+        ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('geo', '0004_location_geohash'),
+        ('foodcartapp', '0057_order_total_cost'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='location',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='orders', to='geo.location', verbose_name='локация'),
+        ),
+        migrations.AddField(
+            model_name='restaurant',
+            name='location',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='restaurants', to='geo.location', verbose_name='локация'),
+        ),
+        migrations.RunPython(link_locations, migrations.RunPython.noop),
+    ]
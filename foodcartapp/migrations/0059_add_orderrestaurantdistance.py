@@ -0,0 +1,35 @@
+# Generated by Django 4.1.5 on 2026-10-18 13:40
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodcartapp', '0058_order_restaurant_location'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderRestaurantDistance',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('distance_km', models.FloatField(verbose_name='расстояние, км')),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='restaurant_distances', to='foodcartapp.order', verbose_name='заказ')),
+                ('restaurant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='order_distances', to='foodcartapp.restaurant', verbose_name='ресторан')),
+            ],
+            options={
+                'verbose_name': 'расстояние от заказа до ресторана',
+                'verbose_name_plural': 'расстояния от заказов до ресторанов',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='orderrestaurantdistance',
+            index=models.Index(fields=['order', 'distance_km'], name='order_distance_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='orderrestaurantdistance',
+            unique_together={('order', 'restaurant')},
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 4.1.5 on 2026-10-18 18:45
+
+from django.db import migrations
+
+from geo.addresses import normalize_address
+
+
+def unlink_mismatched_locations(apps, schema_editor):
+    # Addresses like 5-7 were linked to the location of 57, they get their
+    # own locations from the geocode_backfill command
+    OrderRestaurantDistance = apps.get_model(
+        'foodcartapp',
+        'OrderRestaurantDistance',
+    )
+    for model_name in ['Order', 'Restaurant']:
+        model = apps.get_model('foodcartapp', model_name)
+        mismatched_ids = [
+            instance_id
+            for instance_id, address, location_address, normalized_address
+            in model.objects.filter(location__isnull=False).values_list(
+                'id',
+                'address',
+                'location__address',
+                'location__normalized_address',
+            )
+            if address != location_address
+            and normalize_address(address) != normalized_address
+        ]
+        model.objects.filter(id__in=mismatched_ids).update(location=None)
+        OrderRestaurantDistance.objects.filter(**{
+            f'{model_name.lower()}__in': mismatched_ids,
+        }).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('geo', '0006_renormalize_hyphenated_addresses'),
+        ('foodcartapp', '0059_add_orderrestaurantdistance'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            unlink_mismatched_locations,
+            migrations.RunPython.noop,
+        ),
+    ]
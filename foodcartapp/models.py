@@ -1,11 +1,37 @@
+import logging
 from collections import defaultdict, namedtuple
+from datetime import timedelta
+from decimal import Decimal
 from typing import Dict, List, Tuple
 
+from django.conf import settings
 from django.core.validators import MaxValueValidator, MinValueValidator
 from django.db import models
-from django.db.models import F, Sum
+from django.db.models import (Count, Exists, F, Min, OuterRef, Q, Subquery,
+                              Sum, Value)
+from django.db.models.functions import Coalesce
+from django.utils import timezone
 from phonenumber_field.modelfields import PhoneNumberField
 
+from geo.distances import get_distance_matrix
+from geo.models import Location
+
+from .images import (IMAGE_ERRORS, get_image_srcsets, get_smallest_image_url,
+                     make_image_derivatives)
+
+logger = logging.getLogger(__file__)
+
+
+class LocatedQuerySet(models.QuerySet):
+    def link_locations(self, addresses):
+        """Link the rows with the addresses to the locations saved for them."""
+        return self.filter(address__in=addresses).update(
+            location=Subquery(
+                Location.objects.filter(address=OuterRef('address'))
+                .values('id')[:1]
+            )
+        )
+
 
 class Restaurant(models.Model):
     name = models.CharField(
@@ -22,6 +48,17 @@ class Restaurant(models.Model):
         max_length=50,
         blank=True,
     )
+    location = models.ForeignKey(
+        Location,
+        related_name='restaurants',
+        verbose_name='локация',
+        null=True,
+        blank=True,
+        editable=False,
+        on_delete=models.SET_NULL,
+    )
+
+    objects = LocatedQuerySet.as_manager()
 
     class Meta:
         verbose_name = 'ресторан'
@@ -33,12 +70,42 @@ class Restaurant(models.Model):
 
 class ProductQuerySet(models.QuerySet):
     def available(self):
-        products = (
-            RestaurantMenuItem.objects
-            .filter(availability=True)
-            .values_list('product')
+        return self.filter(is_available=True)
+
+    def annotate_actual_availability(self):
+        available_menu_items = RestaurantMenuItem.objects.filter(
+            product=OuterRef('pk'),
+            availability=True,
         )
-        return self.filter(pk__in=products)
+        return self.annotate(
+            actual_availability=Exists(available_menu_items)
+        )
+
+    def refresh_availability(self):
+        available_menu_items = RestaurantMenuItem.objects.filter(
+            product=OuterRef('pk'),
+            availability=True,
+        )
+        return self.update(is_available=Exists(available_menu_items))
+
+    def filter_catalog(self, category=None, special_status=None,
+                       price_min=None, price_max=None):
+        products = self
+        if category is not None:
+            products = products.filter(category=category)
+        if special_status is not None:
+            products = products.filter(special_status=special_status)
+        if price_min is not None:
+            products = products.filter(price__gte=price_min)
+        if price_max is not None:
+            products = products.filter(price__lte=price_max)
+        return products
+
+    def after_cursor(self, cursor, limit):
+        products = self.order_by('id')
+        if cursor is not None:
+            products = products.filter(id__gt=cursor)
+        return products[:limit]
 
 
 class ProductCategory(models.Model):
@@ -77,6 +144,12 @@ class Product(models.Model):
     image = models.ImageField(
         'картинка'
     )
+    image_derivatives = models.JSONField(
+        'уменьшенные копии картинки',
+        default=dict,
+        blank=True,
+        editable=False,
+    )
     special_status = models.BooleanField(
         'спец.предложение',
         default=False,
@@ -87,18 +160,179 @@ class Product(models.Model):
         max_length=200,
         blank=True,
     )
+    is_available = models.BooleanField(
+        'есть в продаже',
+        default=False,
+        editable=False,
+        help_text='хотя бы в одном ресторане, обновляется автоматически',
+    )
 
     objects = ProductQuerySet.as_manager()
 
     class Meta:
         verbose_name = 'товар'
         verbose_name_plural = 'товары'
+        indexes = [
+            models.Index(
+                fields=['is_available', 'id'],
+                name='product_available_id_idx',
+            ),
+            models.Index(
+                fields=['is_available', 'category', 'id'],
+                name='product_category_id_idx',
+            ),
+            models.Index(
+                fields=['is_available', 'special_status', 'id'],
+                name='product_special_status_id_idx',
+            ),
+            models.Index(
+                fields=['is_available', 'price', 'id'],
+                name='product_price_id_idx',
+            ),
+        ]
 
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        # Copies of the images saved before are made by
+        # the generate_image_derivatives command
+        if self.image and not self.image._committed:
+            try:
+                self.refresh_image_derivatives()
+            except IMAGE_ERRORS:
+                logger.exception(
+                    'Image copies of product %s are not generated',
+                    self.name,
+                )
+                self.image_derivatives = {}
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            # is_available is kept by the menu items, an instance loaded
+            # before they changed must not write it back
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != 'is_available'
+            ]
+        super().save(*args, **kwargs)
+
+    def refresh_image_derivatives(self):
+        if not self.image._committed:
+            self.image.save(self.image.name, self.image.file, save=False)
+        self.image_derivatives = make_image_derivatives(
+            self.image,
+            self.image_derivatives,
+        )
+
+    def get_image_srcsets(self):
+        return get_image_srcsets(self.image, self.image_derivatives)
+
+    def get_image_preview_url(self):
+        return get_smallest_image_url(self.image, self.image_derivatives)
+
+
+class BannerQuerySet(models.QuerySet):
+    def active(self, now):
+        return self.filter(
+            Q(active_from__isnull=True) | Q(active_from__lte=now),
+            Q(active_until__isnull=True) | Q(active_until__gt=now),
+            is_active=True,
+        )
+
+    def get_next_change_at(self, now):
+        """Return when the set of active banners changes next, if ever."""
+        banners = self.filter(is_active=True)
+        changes_at = [
+            banners.filter(active_from__gt=now).aggregate(
+                change_at=Min('active_from')
+            )['change_at'],
+            banners.filter(active_until__gt=now).aggregate(
+                change_at=Min('active_until')
+            )['change_at'],
+        ]
+        changes_at = [change_at for change_at in changes_at if change_at]
+        return min(changes_at, default=None)
+
+
+class Banner(models.Model):
+    title = models.CharField(
+        'заголовок',
+        max_length=50,
+    )
+    image = models.ImageField(
+        'картинка',
+        upload_to='banners',
+    )
+    text = models.CharField(
+        'текст',
+        max_length=200,
+        blank=True,
+    )
+    order = models.PositiveIntegerField(
+        'порядок',
+        default=0,
+        db_index=True,
+    )
+    is_active = models.BooleanField(
+        'показывать',
+        default=True,
+        db_index=True,
+    )
+    active_from = models.DateTimeField(
+        'показывать с',
+        null=True,
+        blank=True,
+    )
+    active_until = models.DateTimeField(
+        'показывать до',
+        null=True,
+        blank=True,
+    )
+
+    objects = BannerQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = 'баннер'
+        verbose_name_plural = 'баннеры'
+        ordering = ['order', 'id']
+
+    def __str__(self):
+        return self.title
+
 
 class RestaurantMenuItemQuerySet(models.QuerySet):
+    # Bulk operations send no signals, so they refresh
+    # Product.is_available and the catalog version themselves.
+
+    def refresh_products(self, products_ids):
+        from .signals import schedule_catalog_update
+
+        Product.objects.filter(id__in=products_ids).refresh_availability()
+        schedule_catalog_update()
+
+    def bulk_create(self, objs, *args, **kwargs):
+        menu_items = super().bulk_create(objs, *args, **kwargs)
+        self.refresh_products(
+            {menu_item.product_id for menu_item in menu_items}
+        )
+        return menu_items
+
+    # bulk_update() is not overridden: it runs update() for every batch
+
+    def update(self, **kwargs):
+        menu_items = list(self.values_list('id', 'product'))
+        updated = super().update(**kwargs)
+        products_ids = {product_id for _, product_id in menu_items}
+        if 'product' in kwargs or 'product_id' in kwargs:
+            # The new product may be an expression, as in bulk_update(), and
+            # the filter of this queryset may not match the items any more
+            products_ids.update(
+                RestaurantMenuItem.objects.filter(
+                    id__in=[menu_item_id for menu_item_id, _ in menu_items]
+                ).values_list('product', flat=True)
+            )
+        self.refresh_products(products_ids)
+        return updated
+
     def get_available_menu_items(self, products_ids):
         return self.filter(availability=True)\
             .select_related('restaurant')\
@@ -106,6 +340,8 @@ class RestaurantMenuItemQuerySet(models.QuerySet):
             'restaurant',
             'restaurant__name',
             'restaurant__address',
+            'restaurant__location__latitude',
+            'restaurant__location__longitude',
             'product'
         ).filter(product__id__in=products_ids)
 
@@ -149,21 +385,41 @@ class RestaurantMenuItem(models.Model):
         menus = defaultdict(list)
         for menu_item in menu_items:
             menus[menu_item['restaurant']].append(menu_item['product'])
+            latitude = menu_item['restaurant__location__latitude']
+            longitude = menu_item['restaurant__location__longitude']
             restaurants[menu_item['restaurant']] = {
+                'id': menu_item['restaurant'],
                 'name': menu_item['restaurant__name'],
-                'address': menu_item['restaurant__address']
+                'address': menu_item['restaurant__address'],
+                'coordinates': (
+                    (latitude, longitude)
+                    if latitude is not None and longitude is not None
+                    else None
+                ),
             }
 
         return menus, restaurants
 
 
-class OrderQuerySet(models.QuerySet):
-    def get_cost(self):
-        return self.prefetch_related('cooking_restaurant').\
-            annotate(
-            cost=Sum(F('items__quantity') * F('items__price'))
+class OrderQuerySet(LocatedQuerySet):
+    @staticmethod
+    def get_items_cost_subquery():
+        items_cost = OrderItem.objects.filter(order=OuterRef('pk'))\
+            .values('order')\
+            .annotate(cost=Sum(F('quantity') * F('price')))\
+            .values('cost')
+        return Coalesce(
+            Subquery(items_cost),
+            Value(Decimal(0)),
+            output_field=models.DecimalField(max_digits=10, decimal_places=2),
         )
 
+    def annotate_actual_cost(self):
+        return self.annotate(actual_cost=self.get_items_cost_subquery())
+
+    def refresh_total_cost(self):
+        return self.update(total_cost=self.get_items_cost_subquery())
+
 
 class Order(models.Model):
     UNPROCESSED = 'UP'
@@ -256,6 +512,26 @@ class Order(models.Model):
         on_delete=models.SET_NULL,
     )
 
+    total_cost = models.DecimalField(
+        verbose_name='стоимость',
+        max_digits=10,
+        decimal_places=2,
+        default=0,
+        editable=False,
+        validators=[MinValueValidator(0), ],
+        help_text='сумма элементов заказа, обновляется автоматически',
+    )
+
+    location = models.ForeignKey(
+        Location,
+        related_name='orders',
+        verbose_name='локация',
+        null=True,
+        blank=True,
+        editable=False,
+        on_delete=models.SET_NULL,
+    )
+
     objects = OrderQuerySet.as_manager()
 
     class Meta:
@@ -285,6 +561,13 @@ class Order(models.Model):
 
         return possible_restaurants
 
+    @staticmethod
+    def get_items_cost(items_fields):
+        return sum(
+            fields['quantity'] * fields['product'].price
+            for fields in items_fields
+        )
+
     @classmethod
     def get_model_description(cls):
         Description = namedtuple('Opts', ['app_label', 'model_name'])
@@ -335,3 +618,159 @@ class OrderItem(models.Model):
             orders_products[order_item['order']].append(order_item['product'])
 
         return orders_products
+
+
+class OrderRestaurantDistanceQuerySet(models.QuerySet):
+    def refresh(self, orders, restaurants):
+        """Save the distances of the orders to the restaurants.
+
+        Pairs without coordinates lose their saved distances.
+        Returns the saved distances.
+        """
+        # Restaurants are few, so they are read first: there is nothing to
+        # load orders for without them
+        restaurants = list(restaurants.select_related('location'))
+        if not restaurants:
+            return []
+        orders = list(orders.select_related('location'))
+        if not orders:
+            return []
+
+        self.filter(order__in=orders, restaurant__in=restaurants).delete()
+        orders = [
+            order for order in orders
+            if order.location and order.location.coordinates
+        ]
+        restaurants = [
+            restaurant for restaurant in restaurants
+            if restaurant.location and restaurant.location.coordinates
+        ]
+        distances = get_distance_matrix(
+            [order.location.coordinates for order in orders],
+            [restaurant.location.coordinates for restaurant in restaurants],
+        )
+        order_distances = [
+            OrderRestaurantDistance(
+                order=order,
+                restaurant=restaurant,
+                distance_km=float(distances[order_index, restaurant_index]),
+            )
+            for order_index, order in enumerate(orders)
+            for restaurant_index, restaurant in enumerate(restaurants)
+        ]
+        return self.bulk_create(order_distances, batch_size=1000)
+
+    def get_missing_orders(self):
+        """Located unfinished orders with a distance to a restaurant unsaved.
+
+        For example, orders located before the distances were saved.
+        """
+        located_restaurants = Restaurant.objects.filter(
+            location__latitude__isnull=False,
+        )
+        return Order.objects.exclude(status=Order.COMPLETED).filter(
+            location__latitude__isnull=False,
+        ).annotate(
+            distances_count=Count(
+                'restaurant_distances',
+                filter=Q(restaurant_distances__restaurant__in=(
+                    located_restaurants
+                )),
+            ),
+        ).filter(distances_count__lt=located_restaurants.count())
+
+    def refresh_addresses(self, addresses):
+        """Refresh the distances of the orders and restaurants at addresses.
+
+        Completed orders are skipped, the dashboard does not show them.
+        """
+        if not addresses:
+            return
+        orders = Order.objects.exclude(status=Order.COMPLETED)
+        restaurants = Restaurant.objects.all()
+        self.refresh(orders.filter(address__in=addresses), restaurants)
+        self.refresh(orders, restaurants.filter(address__in=addresses))
+
+
+class OrderRestaurantDistance(models.Model):
+    order = models.ForeignKey(
+        Order,
+        on_delete=models.CASCADE,
+        verbose_name='заказ',
+        related_name='restaurant_distances',
+    )
+    restaurant = models.ForeignKey(
+        Restaurant,
+        on_delete=models.CASCADE,
+        verbose_name='ресторан',
+        related_name='order_distances',
+    )
+    distance_km = models.FloatField(verbose_name='расстояние, км')
+
+    objects = OrderRestaurantDistanceQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = 'расстояние от заказа до ресторана'
+        verbose_name_plural = 'расстояния от заказов до ресторанов'
+        unique_together = [
+            ['order', 'restaurant']
+        ]
+        indexes = [
+            models.Index(
+                fields=['order', 'distance_km'],
+                name='order_distance_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.order_id} - {self.restaurant_id}: {self.distance_km}'
+
+
+class IdempotencyKeyQuerySet(models.QuerySet):
+    @staticmethod
+    def get_retention_start(now=None):
+        now = now or timezone.now()
+        return now - timedelta(seconds=settings.IDEMPOTENCY_KEY_RETENTION)
+
+    def expired(self, now=None):
+        return self.filter(created_at__lt=self.get_retention_start(now))
+
+    def alive(self, now=None):
+        return self.filter(created_at__gte=self.get_retention_start(now))
+
+
+class IdempotencyKey(models.Model):
+    key = models.CharField(
+        verbose_name='ключ',
+        max_length=255,
+        unique=True,
+    )
+    request_hash = models.CharField(
+        verbose_name='хэш запроса',
+        max_length=64,
+    )
+    order = models.ForeignKey(
+        Order,
+        on_delete=models.CASCADE,
+        verbose_name='заказ',
+        related_name='idempotency_keys',
+    )
+    response = models.JSONField(verbose_name='ответ')
+    status_code = models.PositiveSmallIntegerField(
+        verbose_name='код ответа',
+        default=200,
+    )
+    created_at = models.DateTimeField(
+        verbose_name='создан в',
+        auto_now_add=True,
+        db_index=True,
+    )
+
+    objects = IdempotencyKeyQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = 'ключ идемпотентности'
+        verbose_name_plural = 'ключи идемпотентности'
+
+    def __str__(self):
+        return self.key
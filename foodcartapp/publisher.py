@@ -0,0 +1,159 @@
+import glob
+import gzip
+import logging
+import os
+import tempfile
+import time
+import uuid
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .catalog import (get_banners_snapshot, get_bootstrap_snapshot,
+                      get_catalog_version, get_products_snapshot)
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger(__file__)
+
+KEPT_VERSIONS = 3
+PUBLISH_LOCK_KEY = 'foodcartapp:catalog:publish:lock'
+PUBLISH_LOCK_TIMEOUT = 60
+PUBLISH_POLL_INTERVAL = 0.1
+
+# nginx/nginx.conf maps the query strings of the storefront requests
+# to these files, keep them in sync.
+PUBLISHED_PRODUCTS = {
+    'products': {},
+    'products-all': {'paginate': False},
+    'products-storefront': {'limit': 200, 'compact': True},
+}
+
+
+def write_atomically(path, content):
+    directory = os.path.dirname(path)
+    file_descriptor, temp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(file_descriptor, 'wb') as temp_file:
+            temp_file.write(content)
+        os.chmod(temp_path, 0o644)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+
+def write_with_compressed_copies(path, content):
+    # Compressed copies go first, so nginx never pairs a new file
+    # with an old .gz
+    write_atomically(f'{path}.gz', gzip.compress(content, mtime=0))
+    if brotli:
+        write_atomically(f'{path}.br', brotli.compress(content))
+    write_atomically(path, content)
+
+
+def remove_published(path):
+    for file_path in [path, f'{path}.gz', f'{path}.br']:
+        if os.path.exists(file_path):
+            os.unlink(file_path)
+
+
+def publish_payload(root, name, version, content):
+    """Write name.<version>.json and then point name.json to it."""
+    if content is None:
+        remove_published(os.path.join(root, f'{name}.json'))
+        return
+
+    write_with_compressed_copies(
+        os.path.join(root, f'{name}.{version}.json'),
+        content,
+    )
+    write_with_compressed_copies(os.path.join(root, f'{name}.json'), content)
+
+    versioned_paths = sorted(
+        glob.glob(os.path.join(root, f'{name}.*[0-9].json')),
+        key=os.path.getmtime,
+    )
+    for path in versioned_paths[:-KEPT_VERSIONS]:
+        remove_published(path)
+
+
+def get_published_content(snapshot):
+    if snapshot['expires_at'] is not None:
+        # A static file can not expire when a banner window changes,
+        # such payloads are served by Django.
+        return None
+    return snapshot['content']
+
+
+@contextmanager
+def publish_lock():
+    """Let one process publish at a time, so an older version can not
+    overwrite a newer one. The lock expires if its holder dies."""
+    token = uuid.uuid4().hex
+    while not cache.add(PUBLISH_LOCK_KEY, token, timeout=PUBLISH_LOCK_TIMEOUT):
+        time.sleep(PUBLISH_POLL_INTERVAL)
+    try:
+        yield
+    finally:
+        if cache.get(PUBLISH_LOCK_KEY) == token:
+            cache.delete(PUBLISH_LOCK_KEY)
+
+
+def get_published_payloads():
+    for name, params in PUBLISHED_PRODUCTS.items():
+        snapshot = get_products_snapshot(**params)
+        if isinstance(snapshot, list):
+            snapshot = b''.join(snapshot)
+        yield name, snapshot
+    yield 'banners', get_published_content(get_banners_snapshot())
+    yield 'bootstrap', get_published_content(get_bootstrap_snapshot())
+
+
+def publish_catalog():
+    """Publish the current catalog version.
+
+    Returns the version or None if the catalog changed meanwhile: the
+    newer version is published by the process which changed it.
+    """
+    root = settings.CATALOG_PUBLISH_ROOT
+    if not root:
+        return None
+
+    os.makedirs(root, exist_ok=True)
+    with publish_lock():
+        version = get_catalog_version()
+        for name, content in get_published_payloads():
+            if get_catalog_version() != version:
+                return None
+            publish_payload(root, name, version, content)
+    return version
+
+
+def unpublish_catalog():
+    """Remove the current files, nginx passes their requests to Django."""
+    root = settings.CATALOG_PUBLISH_ROOT
+    if not root:
+        return
+    for name in [*PUBLISHED_PRODUCTS, 'banners', 'bootstrap']:
+        remove_published(os.path.join(root, f'{name}.json'))
+
+
+def publish_catalog_safely():
+    """Publish the catalog after a change without failing the request.
+
+    The change is committed already, so on any error the outdated files
+    are removed rather than served.
+    """
+    try:
+        publish_catalog()
+    except Exception:
+        logger.exception('The catalog was not published')
+        try:
+            unpublish_catalog()
+        except OSError:
+            logger.exception('The outdated catalog files were not removed')
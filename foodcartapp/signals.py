@@ -0,0 +1,103 @@
+import threading
+from contextlib import contextmanager
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from geo.addresses import normalize_address
+from geo.signals import locations_resolved
+
+from .catalog import bump_catalog_version
+from .models import (Banner, Order, OrderRestaurantDistance, Product,
+                     ProductCategory, Restaurant, RestaurantMenuItem)
+from .publisher import publish_catalog_safely
+
+deferred_updates = threading.local()
+
+
+def update_catalog():
+    bump_catalog_version()
+    publish_catalog_safely()
+
+
+def schedule_catalog_update():
+    """Update the catalog once after the current transaction commits."""
+    if getattr(deferred_updates, 'active', False):
+        return
+
+    connection = transaction.get_connection()
+    if connection.in_atomic_block and any(
+        callback[1] is update_catalog for callback in connection.run_on_commit
+    ):
+        return
+    transaction.on_commit(update_catalog)
+
+
+@contextmanager
+def catalog_update_deferred():
+    """Update the catalog once after the block, not after every commit."""
+    already_deferred = getattr(deferred_updates, 'active', False)
+    deferred_updates.active = True
+    try:
+        yield
+    finally:
+        deferred_updates.active = already_deferred
+        if not already_deferred:
+            schedule_catalog_update()
+
+
+@receiver([post_save, post_delete], sender=Banner)
+@receiver([post_save, post_delete], sender=Product)
+@receiver([post_save, post_delete], sender=ProductCategory)
+@receiver([post_save, post_delete], sender=RestaurantMenuItem)
+def invalidate_catalog(sender, **kwargs):
+    schedule_catalog_update()
+
+
+@receiver(pre_save, sender=RestaurantMenuItem)
+def remember_menu_item_product(sender, instance, **kwargs):
+    instance.previous_product_id = None
+    if instance.pk:
+        instance.previous_product_id = (
+            sender.objects.filter(pk=instance.pk)
+            .values_list('product', flat=True)
+            .first()
+        )
+
+
+@receiver(post_save, sender=RestaurantMenuItem)
+def refresh_saved_menu_item_product(sender, instance, **kwargs):
+    products_ids = {instance.product_id, instance.previous_product_id}
+    Product.objects.filter(id__in=products_ids).refresh_availability()
+
+
+@receiver(post_delete, sender=RestaurantMenuItem)
+def refresh_deleted_menu_item_product(sender, instance, **kwargs):
+    Product.objects.filter(id=instance.product_id).refresh_availability()
+
+
+@receiver(locations_resolved)
+def link_resolved_locations(sender, addresses, **kwargs):
+    Order.objects.link_locations(addresses)
+    Restaurant.objects.link_locations(addresses)
+    OrderRestaurantDistance.objects.refresh_addresses(addresses)
+
+
+@receiver(pre_save, sender=Order)
+@receiver(pre_save, sender=Restaurant)
+def unlink_changed_address_location(sender, instance, **kwargs):
+    # The location and the distances are saved again when the new address
+    # is resolved
+    if instance.location_id and (
+        instance.location.normalized_address
+        != normalize_address(instance.address)
+    ):
+        instance.location = None
+        if sender is Order:
+            distances = OrderRestaurantDistance.objects.filter(order=instance)
+        else:
+            distances = OrderRestaurantDistance.objects.filter(
+                restaurant=instance
+            )
+        distances.delete()
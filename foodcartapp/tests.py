@@ -0,0 +1,268 @@
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+from . import views
+from .catalog import bump_catalog_version
+from .models import (IdempotencyKey, Order, Product, Restaurant,
+                     RestaurantMenuItem)
+
+
+def create_product(name='Бургер', price=100):
+    return Product.objects.create(name=name, price=price, image='p.jpg')
+
+
+class ProductAvailabilityTest(TestCase):
+    def setUp(self):
+        self.first_product = create_product('Первый')
+        self.second_product = create_product('Второй')
+        self.first_restaurant = Restaurant.objects.create(name='Первый')
+        self.second_restaurant = Restaurant.objects.create(name='Второй')
+
+    def assertAvailable(self, product, is_available):
+        product.refresh_from_db(fields=['is_available'])
+        self.assertIs(product.is_available, is_available)
+
+    def test_created_menu_item(self):
+        RestaurantMenuItem.objects.create(
+            restaurant=self.first_restaurant,
+            product=self.first_product,
+        )
+        self.assertAvailable(self.first_product, True)
+        self.assertAvailable(self.second_product, False)
+
+    def test_toggled_menu_item(self):
+        menu_item = RestaurantMenuItem.objects.create(
+            restaurant=self.first_restaurant,
+            product=self.first_product,
+        )
+        menu_item.availability = False
+        menu_item.save()
+        self.assertAvailable(self.first_product, False)
+
+        menu_item.availability = True
+        menu_item.save()
+        self.assertAvailable(self.first_product, True)
+
+    def test_moved_menu_item(self):
+        menu_item = RestaurantMenuItem.objects.create(
+            restaurant=self.first_restaurant,
+            product=self.first_product,
+        )
+        menu_item.product = self.second_product
+        menu_item.save()
+        self.assertAvailable(self.first_product, False)
+        self.assertAvailable(self.second_product, True)
+
+    def test_deleted_menu_item(self):
+        menu_item = RestaurantMenuItem.objects.create(
+            restaurant=self.first_restaurant,
+            product=self.first_product,
+        )
+        menu_item.delete()
+        self.assertAvailable(self.first_product, False)
+
+    def test_bulk_created_menu_items(self):
+        RestaurantMenuItem.objects.bulk_create([
+            RestaurantMenuItem(
+                restaurant=self.first_restaurant,
+                product=self.first_product,
+            ),
+            RestaurantMenuItem(
+                restaurant=self.second_restaurant,
+                product=self.second_product,
+                availability=False,
+            ),
+        ])
+        self.assertAvailable(self.first_product, True)
+        self.assertAvailable(self.second_product, False)
+
+    def test_updated_availability(self):
+        RestaurantMenuItem.objects.create(
+            restaurant=self.first_restaurant,
+            product=self.first_product,
+        )
+        RestaurantMenuItem.objects.update(availability=False)
+        self.assertAvailable(self.first_product, False)
+
+    def test_updated_product(self):
+        RestaurantMenuItem.objects.create(
+            restaurant=self.first_restaurant,
+            product=self.first_product,
+        )
+        RestaurantMenuItem.objects.create(
+            restaurant=self.second_restaurant,
+            product=self.first_product,
+        )
+        RestaurantMenuItem.objects.filter(
+            product=self.first_product,
+            restaurant=self.second_restaurant,
+        ).update(product=self.second_product)
+        self.assertAvailable(self.first_product, True)
+        self.assertAvailable(self.second_product, True)
+
+    def test_bulk_updated_menu_items(self):
+        menu_item = RestaurantMenuItem.objects.create(
+            restaurant=self.first_restaurant,
+            product=self.first_product,
+        )
+        menu_item.product = self.second_product
+        RestaurantMenuItem.objects.bulk_update([menu_item], ['product'])
+        self.assertAvailable(self.first_product, False)
+        self.assertAvailable(self.second_product, True)
+
+        menu_item.availability = False
+        RestaurantMenuItem.objects.bulk_update([menu_item], ['availability'])
+        self.assertAvailable(self.second_product, False)
+
+    def test_saved_product_keeps_availability(self):
+        product = Product.objects.get(id=self.first_product.id)
+        RestaurantMenuItem.objects.create(
+            restaurant=self.first_restaurant,
+            product=self.first_product,
+        )
+        product.price = 200
+        product.save()
+        self.assertAvailable(self.first_product, True)
+        self.first_product.refresh_from_db()
+        self.assertEqual(self.first_product.price, 200)
+
+
+class OrderApiTest(TestCase):
+    def setUp(self):
+        self.product = create_product()
+        self.order_data = {
+            'address': 'Москва, ул. Ленина, 1',
+            'firstname': 'Иван',
+            'lastname': 'Петров',
+            'phonenumber': '+79291000000',
+            'products': [{'product': self.product.id, 'quantity': 2}],
+        }
+
+    def post_order(self, order_data, idempotency_key=None):
+        headers = {}
+        if idempotency_key is not None:
+            headers['HTTP_IDEMPOTENCY_KEY'] = idempotency_key
+        return self.client.post(
+            '/api/order/',
+            order_data,
+            content_type='application/json',
+            **headers,
+        )
+
+    def test_idempotent_request_is_replayed(self):
+        response = self.post_order(self.order_data, 'key')
+        replayed_response = self.post_order(self.order_data, 'key')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(replayed_response.status_code, 200)
+        self.assertEqual(replayed_response.json(), response.json())
+        self.assertEqual(replayed_response['Idempotent-Replayed'], 'true')
+        self.assertNotIn('Idempotent-Replayed', response)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_key_of_other_request_is_rejected(self):
+        self.post_order(self.order_data, 'key')
+        response = self.post_order(
+            {**self.order_data, 'firstname': 'Пётр'},
+            'key',
+        )
+
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_concurrent_request_with_key_is_replayed(self):
+        self.post_order(self.order_data, 'key')
+        # A concurrent request checks the key before the first one saves it
+        # and fails on the unique index when it saves the key itself
+        replays = [None]
+
+        def get_idempotent_replay(idempotency_key, request_hash):
+            if replays:
+                return replays.pop()
+            return original_get_idempotent_replay(
+                idempotency_key,
+                request_hash,
+            )
+
+        original_get_idempotent_replay = views.get_idempotent_replay
+        with patch(
+            'foodcartapp.views.get_idempotent_replay',
+            get_idempotent_replay,
+        ):
+            response = self.post_order(self.order_data, 'key')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Idempotent-Replayed'], 'true')
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertEqual(IdempotencyKey.objects.count(), 1)
+
+    def test_batch_returns_result_of_every_order(self):
+        response = self.client.post(
+            '/api/orders/batch/',
+            [self.order_data, {**self.order_data, 'products': []}],
+            content_type='application/json',
+        )
+
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['created'], 1)
+        self.assertEqual(data['failed'], 1)
+        order = Order.objects.get()
+        self.assertEqual(data['results'][0], {'order': {
+            'id': order.id,
+            'address': order.address,
+            'firstname': order.firstname,
+            'lastname': order.lastname,
+            'phonenumber': str(order.phonenumber),
+        }})
+        self.assertIn('products', data['results'][1]['errors'])
+        self.assertEqual(order.total_cost, 2 * self.product.price)
+
+    @override_settings(ORDERS_MAX_IN_FLIGHT=0, ORDERS_RETRY_AFTER=5)
+    def test_saturated_worker_rejects_orders(self):
+        response = self.post_order(self.order_data)
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '5')
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(self.client.get('/api/products/').status_code, 200)
+
+    @override_settings(ORDERS_MAX_IN_FLIGHT=1)
+    def test_finished_orders_free_the_worker(self):
+        for _ in range(3):
+            self.assertEqual(
+                self.post_order(self.order_data).status_code,
+                200,
+            )
+
+
+class CatalogConditionalGetTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.product = create_product()
+
+    def test_unchanged_catalog_is_not_modified(self):
+        response = self.client.get('/api/products/')
+        etag = response['ETag']
+        self.assertEqual(response.status_code, 200)
+
+        response = self.client.get('/api/products/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+
+        response = self.client.get(
+            '/api/products/',
+            {'limit': 10},
+            HTTP_IF_NONE_MATCH=etag,
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_changed_catalog_is_sent_again(self):
+        etag = self.client.get('/api/products/')['ETag']
+        bump_catalog_version()
+
+        response = self.client.get('/api/products/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
@@ -1,6 +1,7 @@
 from django.urls import path
 
-from .views import product_list_api, banners_list_api, register_order
+from .views import (banners_list_api, bootstrap_api, product_list_api,
+                    register_order, register_orders_batch)
 
 
 app_name = "foodcartapp"
@@ -8,5 +9,7 @@ app_name = "foodcartapp"
 urlpatterns = [
     path('products/', product_list_api),
     path('banners/', banners_list_api),
+    path('bootstrap/', bootstrap_api),
     path('order/', register_order),
+    path('orders/batch/', register_orders_batch),
 ]
@@ -1,26 +1,90 @@
-import logging
+import hashlib
+import json
 
-import requests
-from django.core.exceptions import ValidationError
-from django.db import transaction
-from django.http import JsonResponse
-from django.templatetags.static import static
+from django import forms
+from django.db import IntegrityError, transaction
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from rest_framework import status
 from rest_framework.decorators import api_view
+from rest_framework.exceptions import ValidationError
+from rest_framework.relations import PrimaryKeyRelatedField
 from rest_framework.response import Response
-from rest_framework.serializers import ModelSerializer
+from rest_framework.serializers import ListSerializer, ModelSerializer
 
-from geo.models import Location
+from geo.models import GeocodingTask
 
-from .models import Order, OrderItem, Product
+from .catalog import (MAX_PAGE_SIZE, PRODUCT_FIELDS, catalog_condition,
+                      get_banners_cache_control, get_banners_etag,
+                      get_banners_snapshot, get_bootstrap_etag,
+                      get_bootstrap_snapshot, get_products_snapshot)
+from .models import IdempotencyKey, Order, OrderItem, Product
 
-logger = logging.getLogger(__file__)
+MAX_ORDERS_BATCH_SIZE = 1000
+IDEMPOTENCY_KEY_HEADER = 'Idempotency-Key'
+
+
+def get_requested_products_ids(items):
+    products_ids = set()
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        try:
+            products_ids.add(int(item.get('product')))
+        except (TypeError, ValueError):
+            continue
+    return products_ids
+
+
+def get_orders_items(orders):
+    for order in orders:
+        if isinstance(order, dict) and isinstance(order.get('products'), list):
+            yield from order['products']
+
+
+class ProductField(PrimaryKeyRelatedField):
+    """Takes products from context['products'] instead of a query per item.
+
+    OrderItemListSerializer fills the map, a view may fill it beforehand
+    for many orders at once.
+    """
+
+    def to_internal_value(self, data):
+        products = self.context.get('products')
+        if products is None:
+            return super().to_internal_value(data)
+
+        if isinstance(data, bool):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        try:
+            product_id = int(data)
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        if product_id not in products:
+            self.fail('does_not_exist', pk_value=data)
+        return products[product_id]
+
+
+class OrderItemListSerializer(ListSerializer):
+    def to_internal_value(self, data):
+        if isinstance(data, list):
+            products = self.context.setdefault('products', {})
+            missing_products_ids = (
+                get_requested_products_ids(data) - products.keys()
+            )
+            if missing_products_ids:
+                products.update(
+                    Product.objects.in_bulk(missing_products_ids)
+                )
+        return super().to_internal_value(data)
 
 
 class OrderItemSerializer(ModelSerializer):
+    product = ProductField(queryset=Product.objects.all())
+
     class Meta:
         model = OrderItem
         fields = ['product', 'quantity', ]
+        list_serializer_class = OrderItemListSerializer
 
 
 class OrderSerializer(ModelSerializer):
@@ -42,94 +106,260 @@ class OrderSerializer(ModelSerializer):
         ]
 
 
+class QueryBooleanField(forms.NullBooleanField):
+    # Accepts 1/0 as well as true/false, unlike the select widget
+    widget = forms.TextInput
+
+
+class ProductFilterForm(forms.Form):
+    paginate = QueryBooleanField(required=False)
+    cursor = forms.IntegerField(required=False, min_value=0)
+    limit = forms.IntegerField(
+        required=False,
+        min_value=1,
+        max_value=MAX_PAGE_SIZE,
+    )
+    category = forms.IntegerField(required=False, min_value=1)
+    special_status = QueryBooleanField(required=False)
+    price_min = forms.DecimalField(
+        required=False,
+        min_value=0,
+        max_digits=8,
+        decimal_places=2,
+    )
+    price_max = forms.DecimalField(
+        required=False,
+        min_value=0,
+        max_digits=8,
+        decimal_places=2,
+    )
+    fields = forms.CharField(required=False)
+    compact = QueryBooleanField(required=False)
+
+    def clean_fields(self):
+        if not self.cleaned_data['fields']:
+            return None
+        fields = self.cleaned_data['fields'].split(',')
+        unknown_fields = set(fields) - set(PRODUCT_FIELDS)
+        if unknown_fields:
+            raise forms.ValidationError(
+                'Неизвестные поля: %(fields)s',
+                params={'fields': ', '.join(sorted(unknown_fields))},
+            )
+        return tuple(
+            field for field in PRODUCT_FIELDS if field in fields
+        )
+
+
+@catalog_condition(
+    etag_func=get_banners_etag,
+    last_modified_func=None,
+    cache_control_func=get_banners_cache_control,
+)
 def banners_list_api(request):
-    # FIXME move data to db?
-    return JsonResponse([
-        {
-            'title': 'Burger',
-            'src': static('burger.jpg'),
-            'text': 'Tasty Burger at your doorstep',
-        },
-        {
-            'title': 'Spices',
-            'src': static('food.jpg'),
-            'text': 'All Cuisines',
-        },
-        {
-            'title': 'New York',
-            'src': static('tasty.jpg'),
-            'text': 'Food is incomplete without a tasty dessert',
-        }
-    ], safe=False, json_dumps_params={
-        'ensure_ascii': False,
-        'indent': 4,
-    })
+    return HttpResponse(
+        get_banners_snapshot()['content'],
+        content_type='application/json',
+    )
 
 
+@catalog_condition
 def product_list_api(request):
-    products = Product.objects.select_related('category').available()
-
-    dumped_products = []
-    for product in products:
-        dumped_product = {
-            'id': product.id,
-            'name': product.name,
-            'price': product.price,
-            'special_status': product.special_status,
-            'description': product.description,
-            'category': {
-                'id': product.category.id,
-                'name': product.category.name,
-            } if product.category else None,
-            'image': product.image.url,
-            'restaurant': {
-                'id': product.id,
-                'name': product.name,
-            }
-        }
-        dumped_products.append(dumped_product)
-    return JsonResponse(dumped_products, safe=False, json_dumps_params={
-        'ensure_ascii': False,
-        'indent': 4,
-    })
+    form = ProductFilterForm(request.GET)
+    if not form.is_valid():
+        return JsonResponse(
+            {'error': form.errors},
+            status=status.HTTP_400_BAD_REQUEST,
+            json_dumps_params={'ensure_ascii': False},
+        )
+    snapshot = get_products_snapshot(**form.cleaned_data)
+    if form.cleaned_data['compact']:
+        return StreamingHttpResponse(
+            snapshot,
+            content_type='application/json',
+        )
+    return HttpResponse(snapshot, content_type='application/json')
+
+
+@catalog_condition(
+    etag_func=get_bootstrap_etag,
+    last_modified_func=None,
+)
+def bootstrap_api(request):
+    return HttpResponse(
+        get_bootstrap_snapshot()['content'],
+        content_type='application/json',
+    )
+
+
+def get_request_hash(data):
+    serialized_data = json.dumps(data, sort_keys=True, default=str)
+    return hashlib.sha256(serialized_data.encode()).hexdigest()
+
+
+def get_idempotent_replay(idempotency_key, request_hash):
+    """Return (data, status, headers) saved for the key or None."""
+    stored_key = (
+        IdempotencyKey.objects.alive()
+        .filter(key=idempotency_key)
+        .first()
+    )
+    if not stored_key:
+        return None
+    if stored_key.request_hash != request_hash:
+        return (
+            {'error': f'Ключ {IDEMPOTENCY_KEY_HEADER} уже использован '
+                      'для другого запроса'},
+            status.HTTP_422_UNPROCESSABLE_ENTITY,
+            {},
+        )
+    return (
+        stored_key.response,
+        stored_key.status_code,
+        {'Idempotent-Replayed': 'true'},
+    )
+
+
+def process_order_registration(order_data, idempotency_key=None):
+    """Validate and save an order, return (data, status, headers)."""
+    if idempotency_key is not None:
+        max_length = IdempotencyKey._meta.get_field('key').max_length
+        if not 0 < len(idempotency_key) <= max_length:
+            return (
+                {'error': f'Длина {IDEMPOTENCY_KEY_HEADER} должна быть '
+                          f'от 1 до {max_length} символов'},
+                status.HTTP_400_BAD_REQUEST,
+                {},
+            )
+        request_hash = get_request_hash(order_data)
+        replay = get_idempotent_replay(idempotency_key, request_hash)
+        if replay:
+            return replay
+
+    serializer = OrderSerializer(data=order_data)
+    if not serializer.is_valid():
+        return serializer.errors, status.HTTP_400_BAD_REQUEST, {}
+
+    try:
+        with transaction.atomic():
+            order = Order.objects.create(
+                address=serializer.validated_data['address'],
+                firstname=serializer.validated_data['firstname'],
+                lastname=serializer.validated_data['lastname'],
+                phonenumber=serializer.validated_data['phonenumber'],
+                total_cost=Order.get_items_cost(
+                    serializer.validated_data['products']
+                ),
+            )
+
+            products_fields = serializer.validated_data['products']
+            order_items = [
+                OrderItem(
+                    order=order,
+                    price=fields['product'].price,
+                    **fields
+                ) for fields in products_fields
+            ]
+            OrderItem.objects.bulk_create(order_items)
+            GeocodingTask.objects.enqueue([order.address])
+
+            response_data = OrderSerializer(order).data
+            if idempotency_key is not None:
+                IdempotencyKey.objects.expired().filter(
+                    key=idempotency_key
+                ).delete()
+                # The unique index makes a concurrent request with the same
+                # key wait for this transaction and then fail
+                IdempotencyKey.objects.create(
+                    key=idempotency_key,
+                    request_hash=request_hash,
+                    order=order,
+                    response=response_data,
+                )
+    except IntegrityError:
+        if idempotency_key is None:
+            raise
+        replay = get_idempotent_replay(idempotency_key, request_hash)
+        if not replay:
+            raise
+        return replay
+
+    return response_data, status.HTTP_200_OK, {}
 
 
 @api_view(['POST'])
 def register_order(request):
-    serializer = OrderSerializer(data=request.data)
-    try:
-        serializer.is_valid(raise_exception=True)
-    except (ValidationError) as error:
+    data, status_code, headers = process_order_registration(
+        request.data,
+        request.headers.get(IDEMPOTENCY_KEY_HEADER),
+    )
+    return Response(data, status=status_code, headers=headers)
+
+
+@api_view(['POST'])
+def register_orders_batch(request):
+    orders_data = request.data
+    if not isinstance(orders_data, list) or not orders_data:
         return Response(
-            {'error': error},
-            status=status.HTTP_406_NOT_ACCEPTABLE
+            {'error': 'Ожидается непустой список заказов'},
+            status=status.HTTP_400_BAD_REQUEST,
         )
-    with transaction.atomic():
-        order = Order.objects.create(
-            address=serializer.validated_data['address'],
-            firstname=serializer.validated_data['firstname'],
-            lastname=serializer.validated_data['lastname'],
-            phonenumber=serializer.validated_data['phonenumber'],
+    if len(orders_data) > MAX_ORDERS_BATCH_SIZE:
+        return Response(
+            {'error': f'Не больше {MAX_ORDERS_BATCH_SIZE} заказов за раз'},
+            status=status.HTTP_400_BAD_REQUEST,
         )
 
-        products_fields = serializer.validated_data['products']
+    products = Product.objects.in_bulk(
+        get_requested_products_ids(get_orders_items(orders_data))
+    )
+    # One serializer for all the orders: building DRF fields is the costly
+    # part, so they are built once, like ListSerializer does
+    serializer = OrderSerializer(context={'products': products})
+    validated_orders = []
+    errors = {}
+    for index, order_data in enumerate(orders_data):
+        try:
+            validated_orders.append(
+                (index, serializer.run_validation(order_data))
+            )
+        except ValidationError as error:
+            errors[index] = error.detail
+
+    orders = [
+        Order(
+            address=validated_data['address'],
+            firstname=validated_data['firstname'],
+            lastname=validated_data['lastname'],
+            phonenumber=validated_data['phonenumber'],
+            total_cost=Order.get_items_cost(validated_data['products']),
+        ) for _, validated_data in validated_orders
+    ]
+    with transaction.atomic():
+        Order.objects.bulk_create(orders)
         order_items = [
             OrderItem(
                 order=order,
                 price=fields['product'].price,
                 **fields
-            ) for fields in products_fields
+            )
+            for order, (_, validated_data) in zip(orders, validated_orders)
+            for fields in validated_data['products']
         ]
         OrderItem.objects.bulk_create(order_items)
+        GeocodingTask.objects.enqueue(order.address for order in orders)
 
-    try:
-        Location.save_location(order.address)
-    except requests.ConnectionError:
-        logger.warning(
-            'Connection error. Location for order %s'
-            ' was not saved',
-            order
-        )
-
-    serializer = OrderSerializer(order)
-    return Response(serializer.data)
+    created_orders = {
+        index: order
+        for order, (index, _) in zip(orders, validated_orders)
+    }
+    results = [
+        {'order': serializer.to_representation(created_orders[index])}
+        if index in created_orders else {'errors': errors[index]}
+        for index in range(len(orders_data))
+    ]
+    return Response({
+        'created': len(orders),
+        'failed': len(errors),
+        'results': results,
+    })
@@ -0,0 +1,70 @@
+import re
+
+# Spellings of the same address part, mapped to one token
+ADDRESS_TOKENS = {
+    'улица': 'ул',
+    'ул': 'ул',
+    'проспект': 'пр',
+    'просп': 'пр',
+    'прт': 'пр',
+    'пр': 'пр',
+    'переулок': 'пер',
+    'пер': 'пер',
+    'проезд': 'прд',
+    'прд': 'прд',
+    'бульвар': 'бр',
+    'бул': 'бр',
+    'бр': 'бр',
+    'набережная': 'наб',
+    'наб': 'наб',
+    'площадь': 'пл',
+    'пл': 'пл',
+    'шоссе': 'ш',
+    'ш': 'ш',
+    'область': 'обл',
+    'обл': 'обл',
+    'корпус': 'к',
+    'корп': 'к',
+    'к': 'к',
+    'строение': 'стр',
+    'стр': 'стр',
+    'квартира': 'кв',
+    'кв': 'кв',
+}
+# Parts people often leave out, they do not change the place
+OMITTED_TOKENS = {'россия', 'город', 'дом'}
+# Short forms of the omitted parts, left out only before a name or a number:
+# after a house number they are building letters, 5 г and 5г2 are not 5
+OMITTED_PREFIXES = {'г', 'д'}
+
+
+def normalize_address(address):
+    """Return a lookup key equal for spellings of the same address.
+
+    'г. Москва, улица Тверская, дом 1' and 'москва ул.тверская 1' give
+    'москва ул тверская 1'. A letter after a house number is kept with it,
+    'ул. Ленина 5г' gives 'ул ленина 5г'.
+    """
+    address = address.lower().replace('ё', 'е')
+    # 5-а is the house 5а, but 5-7 is not the house 57
+    address = re.sub(r'(?<=\d)-(?=[^\W\d])', '', address)
+    address = address.replace('-', ' ')
+    # 10к2 is 10 к 2, but 5г is one house number
+    address = re.sub(
+        r'(?<=\d)(?=[^\W\d]\w)|(?<=[^\W\d])(?=\d)',
+        ' ',
+        address,
+    )
+    tokens = re.findall(r'\w+', address)
+    normalized_tokens = []
+    for index, token in enumerate(tokens):
+        if token in OMITTED_TOKENS:
+            continue
+        if (
+            token in OMITTED_PREFIXES
+            and index + 1 < len(tokens)
+            and not (index and tokens[index - 1].isdigit())
+        ):
+            continue
+        normalized_tokens.append(ADDRESS_TOKENS.get(token, token))
+    return ' '.join(normalized_tokens)
@@ -1,9 +1,34 @@
 from django.contrib import admin
+from django.utils import timezone
 
-from .models import Location
+from .models import GeocodingTask, Location
 
 
 @admin.register(Location)
 class RestaurantAdmin(admin.ModelAdmin):
-    list_display = ['__str__', 'changed_at',]
-    readonly_fields = ['id', 'changed_at',]
+    list_display = ['__str__', 'latitude', 'longitude', 'changed_at',]
+    readonly_fields = ['id', 'normalized_address', 'geohash', 'changed_at',]
+    search_fields = ['address', 'normalized_address']
+
+
+@admin.register(GeocodingTask)
+class GeocodingTaskAdmin(admin.ModelAdmin):
+    list_display = [
+        'address',
+        'status',
+        'attempts',
+        'next_attempt_at',
+        'created_at',
+    ]
+    list_filter = ['status']
+    search_fields = ['address']
+    readonly_fields = ['id', 'attempts', 'last_error', 'created_at']
+    actions = ['retry']
+
+    @admin.action(description='Вернуть в очередь')
+    def retry(self, request, queryset):
+        queryset.update(
+            status=GeocodingTask.PENDING,
+            attempts=0,
+            next_attempt_at=timezone.now(),
+        )
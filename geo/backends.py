@@ -0,0 +1,160 @@
+"""Geocoders turning an address into (latitude, longitude).
+
+The backend is chosen by the GEOCODER_BACKEND setting. LocalGeocoder
+works offline, for load tests and CI.
+"""
+import asyncio
+import hashlib
+from abc import ABC, abstractmethod
+import json
+import random
+import threading
+import time
+from contextlib import nullcontext
+
+import requests
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.module_loading import import_string
+
+from .addresses import normalize_address
+from .client import get_geocoder_client
+
+# The area LocalGeocoder places unknown addresses in, around Moscow
+LOCAL_LATITUDES = (55.55, 55.95)
+LOCAL_LONGITUDES = (37.35, 37.85)
+
+
+class BaseGeocoder(ABC):
+    @classmethod
+    def from_settings(cls):
+        return cls()
+
+    @abstractmethod
+    def fetch_coordinates(self, address):
+        """Return (latitude, longitude) or None if nothing is found."""
+
+    def get_async_client(self):
+        """Return an async context manager giving afetch_coordinates client."""
+        return nullcontext()
+
+    @abstractmethod
+    async def afetch_coordinates(self, client, address):
+        """Like fetch_coordinates, with the client of get_async_client."""
+
+
+class YandexGeocoder(BaseGeocoder):
+    def __init__(self, api_key):
+        if not api_key:
+            raise ImproperlyConfigured('YandexGeocoder needs YA_API_KEY')
+        self.api_key = api_key
+
+    @classmethod
+    def from_settings(cls):
+        return cls(settings.YA_API_KEY)
+
+    def get_params(self, address):
+        return {
+            "geocode": address,
+            "apikey": self.api_key,
+            "format": "json",
+        }
+
+    @staticmethod
+    def parse_coordinates(geocoder_response):
+        found_response = geocoder_response['response']
+        found_places = found_response['GeoObjectCollection']['featureMember']
+
+        if not found_places:
+            return None
+
+        most_relevant = found_places[0]
+        lon, lat = most_relevant['GeoObject']['Point']['pos'].split(" ")
+        return lat, lon
+
+    def fetch_coordinates(self, address):
+        geocoder_response = get_geocoder_client().get(
+            self.get_params(address)
+        )
+        return self.parse_coordinates(geocoder_response)
+
+    def get_async_client(self):
+        return get_geocoder_client().get_async_client()
+
+    async def afetch_coordinates(self, client, address):
+        geocoder_response = await get_geocoder_client().aget(
+            client,
+            self.get_params(address),
+        )
+        return self.parse_coordinates(geocoder_response)
+
+
+class LocalGeocoder(BaseGeocoder):
+    """Answers from a fixture or makes up stable coordinates.
+
+    The fixture is a JSON object mapping addresses to [latitude, longitude]
+    or null for not found ones. Other addresses get coordinates derived
+    from the hash of the normalized address, so they never change.
+    Every request waits `latency` seconds and fails with the probability
+    `error_rate`, like a real geocoder under load.
+    """
+
+    def __init__(self, fixture_path=None, latency=0, error_rate=0):
+        self.fixture = {}
+        if fixture_path:
+            with open(fixture_path, encoding='utf-8') as fixture_file:
+                self.fixture = {
+                    normalize_address(address): coordinates
+                    for address, coordinates in json.load(fixture_file).items()
+                }
+        self.latency = latency
+        self.error_rate = error_rate
+
+    @classmethod
+    def from_settings(cls):
+        return cls(
+            settings.GEOCODER_FIXTURE,
+            settings.GEOCODER_LATENCY,
+            settings.GEOCODER_ERROR_RATE,
+        )
+
+    def lookup(self, address):
+        if random.random() < self.error_rate:
+            raise requests.ConnectionError(
+                f'Injected geocoder error for {address}'
+            )
+
+        normalized_address = normalize_address(address)
+        if normalized_address in self.fixture:
+            coordinates = self.fixture[normalized_address]
+            return tuple(coordinates) if coordinates else None
+
+        digest = hashlib.sha256(normalized_address.encode()).digest()
+        latitude_share = int.from_bytes(digest[:4], 'big') / 2 ** 32
+        longitude_share = int.from_bytes(digest[4:8], 'big') / 2 ** 32
+        min_latitude, max_latitude = LOCAL_LATITUDES
+        min_longitude, max_longitude = LOCAL_LONGITUDES
+        return (
+            min_latitude + (max_latitude - min_latitude) * latitude_share,
+            min_longitude + (max_longitude - min_longitude) * longitude_share,
+        )
+
+    def fetch_coordinates(self, address):
+        time.sleep(self.latency)
+        return self.lookup(address)
+
+    async def afetch_coordinates(self, client, address):
+        await asyncio.sleep(self.latency)
+        return self.lookup(address)
+
+
+geocoder = None
+geocoder_lock = threading.Lock()
+
+
+def get_geocoder():
+    global geocoder
+    with geocoder_lock:
+        if geocoder is None:
+            geocoder = import_string(settings.GEOCODER_BACKEND).from_settings()
+        return geocoder
@@ -0,0 +1,191 @@
+"""HTTP client of the Yandex geocoder shared by the process.
+
+Connections are kept alive in a pool, every request has connect and read
+timeouts and is retried a few times. After GEOCODER_CIRCUIT_FAILURES
+failed requests in a row the circuit breaker fails the requests at once
+for GEOCODER_CIRCUIT_COOLDOWN seconds, then lets one trial request through.
+"""
+import threading
+import time
+
+import httpx
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from star_burger import metrics
+
+GEOCODER_URL = 'https://geocode-maps.yandex.ru/1.x'
+GEOCODER_POOL_SIZE = 10
+RETRY_STATUSES = [429, 500, 502, 503, 504]
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half-open'
+CIRCUIT_STATE_VALUES = {CLOSED: 0, OPEN: 1, HALF_OPEN: 2}
+
+metrics.register(
+    'geocoder_circuit_state',
+    'gauge',
+    'Geocoder circuit breaker state: 0 closed, 1 open, 2 half-open',
+)
+metrics.register(
+    'geocoder_requests_total',
+    'counter',
+    'Geocoder requests by result: ok, error or rejected by the breaker',
+)
+metrics.register(
+    'geocoder_request_seconds',
+    'summary',
+    'Geocoder request duration, retries included',
+)
+
+# Errors of a geocoder request, both sync and async
+GEOCODER_ERRORS = (requests.RequestException, httpx.HTTPError)
+
+
+class CircuitOpenError(requests.ConnectionError):
+    """The geocoder is not called while the circuit is open."""
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold, cooldown):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self.trial_started = False
+        self.lock = threading.Lock()
+        self.set_state(CLOSED)
+
+    def set_state(self, state):
+        self.state = state
+        metrics.set_value(
+            'geocoder_circuit_state',
+            CIRCUIT_STATE_VALUES[state],
+        )
+
+    def before_call(self):
+        with self.lock:
+            if self.state == OPEN:
+                if time.monotonic() - self.opened_at < self.cooldown:
+                    self.reject()
+                self.set_state(HALF_OPEN)
+                self.trial_started = False
+            if self.state == HALF_OPEN:
+                if self.trial_started:
+                    self.reject()
+                self.trial_started = True
+
+    def reject(self):
+        metrics.inc('geocoder_requests_total', result='rejected')
+        raise CircuitOpenError(
+            f'The geocoder circuit is open for {self.cooldown} s '
+            f'after {self.failure_threshold} failures'
+        )
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.set_state(CLOSED)
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if (
+                self.state == HALF_OPEN
+                or self.failures >= self.failure_threshold
+            ):
+                self.opened_at = time.monotonic()
+                self.set_state(OPEN)
+
+
+class GeocoderClient:
+    def __init__(self):
+        retry = Retry(
+            total=settings.GEOCODER_RETRIES,
+            backoff_factor=0.3,
+            status_forcelist=RETRY_STATUSES,
+            allowed_methods=['GET'],
+            raise_on_status=False,
+        )
+        self.session = requests.Session()
+        self.session.mount(
+            'https://',
+            HTTPAdapter(pool_maxsize=GEOCODER_POOL_SIZE, max_retries=retry),
+        )
+        self.timeout = (
+            settings.GEOCODER_CONNECT_TIMEOUT,
+            settings.GEOCODER_READ_TIMEOUT,
+        )
+        self.breaker = CircuitBreaker(
+            settings.GEOCODER_CIRCUIT_FAILURES,
+            settings.GEOCODER_CIRCUIT_COOLDOWN,
+        )
+
+    def get_async_client(self):
+        """Return an httpx.AsyncClient with the same limits."""
+        return httpx.AsyncClient(
+            transport=httpx.AsyncHTTPTransport(
+                retries=settings.GEOCODER_RETRIES,
+            ),
+            timeout=httpx.Timeout(
+                settings.GEOCODER_READ_TIMEOUT,
+                connect=settings.GEOCODER_CONNECT_TIMEOUT,
+            ),
+            limits=httpx.Limits(max_connections=GEOCODER_POOL_SIZE),
+        )
+
+    def record_result(self, started_at, error=None):
+        metrics.observe(
+            'geocoder_request_seconds',
+            time.monotonic() - started_at,
+        )
+        if error:
+            self.breaker.record_failure()
+            metrics.inc('geocoder_requests_total', result='error')
+        else:
+            self.breaker.record_success()
+            metrics.inc('geocoder_requests_total', result='ok')
+
+    def get(self, params):
+        self.breaker.before_call()
+        started_at = time.monotonic()
+        try:
+            response = self.session.get(
+                GEOCODER_URL,
+                params=params,
+                timeout=self.timeout,
+            )
+            response.raise_for_status()
+        except requests.RequestException as error:
+            self.record_result(started_at, error)
+            raise
+        self.record_result(started_at)
+        return response.json()
+
+    async def aget(self, client, params):
+        """Async get, `client` is made by get_async_client()."""
+        self.breaker.before_call()
+        started_at = time.monotonic()
+        try:
+            response = await client.get(GEOCODER_URL, params=params)
+            response.raise_for_status()
+        except httpx.HTTPError as error:
+            self.record_result(started_at, error)
+            raise
+        self.record_result(started_at)
+        return response.json()
+
+
+geocoder_client = None
+geocoder_client_lock = threading.Lock()
+
+
+def get_geocoder_client():
+    global geocoder_client
+    with geocoder_client_lock:
+        if geocoder_client is None:
+            geocoder_client = GeocoderClient()
+        return geocoder_client
@@ -0,0 +1,29 @@
+import numpy as np
+
+# The mean Earth radius, the one geopy.distance.great_circle uses
+EARTH_RADIUS_KM = 6371.009
+
+
+def get_distance_matrix(origins, destinations):
+    """Return distances in km from every origin to every destination.
+
+    `origins` and `destinations` are sequences of (latitude, longitude).
+    The haversine formula is computed for all the pairs at once. The Earth
+    is taken for a sphere, so the distances differ from the geodesic ones
+    by up to 0.6%, most for short north-south distances near the equator.
+    """
+    origins = np.radians(np.asarray(origins, dtype=float).reshape(-1, 2))
+    destinations = np.radians(
+        np.asarray(destinations, dtype=float).reshape(-1, 2)
+    )
+    origin_latitudes = origins[:, 0, np.newaxis]
+    origin_longitudes = origins[:, 1, np.newaxis]
+    destination_latitudes = destinations[np.newaxis, :, 0]
+    destination_longitudes = destinations[np.newaxis, :, 1]
+
+    haversine = (
+        np.sin((destination_latitudes - origin_latitudes) / 2) ** 2
+        + np.cos(origin_latitudes) * np.cos(destination_latitudes)
+        * np.sin((destination_longitudes - origin_longitudes) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(haversine, 0, 1)))
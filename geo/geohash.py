@@ -0,0 +1,127 @@
+"""Geohash cells of locations for nearby searches.
+
+A geohash of length N names a lat/lon cell, the cells of length N + 1 split
+it into 32 smaller ones, so all the locations of a cell share its geohash as
+a prefix. A point and the 8 cells around its cell cover a circle of
+get_covered_radius() km around the point.
+"""
+import math
+
+from .distances import EARTH_RADIUS_KM
+
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+# The length saved in Location.geohash, cells of about 5 x 5 m
+GEOHASH_LENGTH = 9
+# Cells of about 150 x 150 m, the nearest search starts with them
+NEAREST_START_PRECISION = 7
+
+
+def encode(latitude, longitude, precision=GEOHASH_LENGTH):
+    latitude_range = [-90.0, 90.0]
+    longitude_range = [-180.0, 180.0]
+    geohash = []
+    bits = 0
+    bits_count = 0
+    is_longitude_bit = True
+    while len(geohash) < precision:
+        if is_longitude_bit:
+            value, value_range = longitude, longitude_range
+        else:
+            value, value_range = latitude, latitude_range
+        middle = (value_range[0] + value_range[1]) / 2
+        bits <<= 1
+        if value >= middle:
+            bits |= 1
+            value_range[0] = middle
+        else:
+            value_range[1] = middle
+        is_longitude_bit = not is_longitude_bit
+
+        bits_count += 1
+        if bits_count == 5:
+            geohash.append(BASE32[bits])
+            bits = 0
+            bits_count = 0
+    return ''.join(geohash)
+
+
+def get_cell_size(precision):
+    """Return (height, width) in degrees of the cells of the precision."""
+    bits_count = 5 * precision
+    latitude_bits_count = bits_count // 2
+    longitude_bits_count = bits_count - latitude_bits_count
+    return 180 / 2 ** latitude_bits_count, 360 / 2 ** longitude_bits_count
+
+
+def decode(geohash):
+    """Return the (latitude, longitude) of the cell centre."""
+    latitude_range = [-90.0, 90.0]
+    longitude_range = [-180.0, 180.0]
+    is_longitude_bit = True
+    for char in geohash:
+        bits = BASE32.index(char)
+        for shift in range(4, -1, -1):
+            if is_longitude_bit:
+                value_range = longitude_range
+            else:
+                value_range = latitude_range
+            middle = (value_range[0] + value_range[1]) / 2
+            if bits >> shift & 1:
+                value_range[0] = middle
+            else:
+                value_range[1] = middle
+            is_longitude_bit = not is_longitude_bit
+    return (
+        (latitude_range[0] + latitude_range[1]) / 2,
+        (longitude_range[0] + longitude_range[1]) / 2,
+    )
+
+
+def get_neighbours(geohash):
+    """Return the cells around the cell, 8 or less near the poles."""
+    latitude, longitude = decode(geohash)
+    height, width = get_cell_size(len(geohash))
+    neighbours = set()
+    for latitude_shift in (-1, 0, 1):
+        neighbour_latitude = latitude + latitude_shift * height
+        if not -90 < neighbour_latitude < 90:
+            continue
+        for longitude_shift in (-1, 0, 1):
+            neighbour_longitude = longitude + longitude_shift * width
+            neighbour_longitude = (neighbour_longitude + 180) % 360 - 180
+            neighbours.add(encode(
+                neighbour_latitude,
+                neighbour_longitude,
+                len(geohash),
+            ))
+    neighbours.discard(geohash)
+    return neighbours
+
+
+def get_cells(latitude, longitude, precision):
+    """Return the cell of the point and the cells around it."""
+    geohash = encode(latitude, longitude, precision)
+    return {geohash, *get_neighbours(geohash)}
+
+
+def get_covered_radius(latitude, precision):
+    """Return km around the point surely covered by get_cells()."""
+    height, width = get_cell_size(precision)
+    # Cells narrow towards the poles, so the width is taken at the far edge
+    # of the cells around
+    farthest_latitude = min(abs(latitude) + 2 * height, 90)
+    width_share = math.cos(math.radians(farthest_latitude)) * math.sin(
+        math.radians(min(width, 90))
+    )
+    return EARTH_RADIUS_KM * min(
+        math.radians(height),
+        math.asin(width_share),
+    )
+
+
+def get_precision(latitude, radius_km):
+    """Return the longest precision covering the radius, 0 if none does."""
+    for precision in range(GEOHASH_LENGTH, 0, -1):
+        if get_covered_radius(latitude, precision) >= radius_km:
+            return precision
+    return 0
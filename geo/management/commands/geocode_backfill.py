@@ -0,0 +1,176 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from foodcartapp.models import Order, Restaurant
+from geo.addresses import normalize_address
+from geo.backends import get_geocoder
+from geo.client import GEOCODER_ERRORS
+from geo.models import Location
+from geo.signals import locations_resolved
+
+
+class TokenBucket:
+    """Lets `rate` calls a second through, shared by all the threads."""
+
+    def __init__(self, rate, capacity=1):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def take(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(
+                    self.capacity,
+                    self.tokens + (now - self.updated_at) * self.rate,
+                )
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class Command(BaseCommand):
+    help = 'Geocodes order and restaurant addresses which have no location'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=8,
+            help='how many geocoder requests are sent at once',
+        )
+        parser.add_argument(
+            '--rate',
+            type=float,
+            default=10,
+            help='the most geocoder requests a second, for all the workers',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=100,
+            help='how many locations are saved with one query',
+        )
+
+    def handle(self, *args, **options):
+        addresses = self.get_addresses_without_location()
+        self.stdout.write(f'{len(addresses)} addresses have no location')
+
+        cached_locations = Location.objects.find_cached(addresses)
+        self.save_locations([
+            (address, location.coordinates)
+            for address, location in cached_locations.items()
+        ])
+        addresses = [
+            address for address in addresses
+            if address not in cached_locations
+        ]
+        self.stdout.write(
+            f'{len(cached_locations)} are matched with saved locations, '
+            f'{len(addresses)} are sent to the geocoder'
+        )
+
+        self.geocode(addresses, options)
+
+    @staticmethod
+    def get_addresses_without_location():
+        saved_addresses = Location.objects.values('address')
+        addresses = set()
+        for model in [Order, Restaurant]:
+            addresses.update(
+                model.objects.exclude(address='')
+                .exclude(address__in=saved_addresses)
+                .values_list('address', flat=True)
+                .distinct()
+            )
+        return sorted(addresses)
+
+    def geocode(self, addresses, options):
+        bucket = TokenBucket(options['rate'])
+        geocoder = get_geocoder()
+
+        def fetch(address):
+            bucket.take()
+            return geocoder.fetch_coordinates(address)
+
+        started_at = time.monotonic()
+        results = []
+        done = errors = 0
+        executor = ThreadPoolExecutor(max_workers=options['workers'])
+        futures = {
+            executor.submit(fetch, address): address for address in addresses
+        }
+        try:
+            for future in as_completed(futures):
+                address = futures[future]
+                done += 1
+                try:
+                    results.append((address, future.result()))
+                except GEOCODER_ERRORS as error:
+                    errors += 1
+                    self.stderr.write(f'{address}: {error}')
+
+                if len(results) >= options['batch_size']:
+                    self.save_locations(results)
+                    results = []
+                    self.report(done, len(addresses), errors, started_at)
+        finally:
+            # Saved batches are not geocoded again, so an interrupted run
+            # continues from the unsaved addresses
+            executor.shutdown(wait=False, cancel_futures=True)
+            self.save_locations(results)
+
+        self.report(done, len(addresses), errors, started_at)
+        if errors:
+            self.stdout.write(self.style.WARNING(
+                f'{errors} addresses failed, run the command again '
+                'to retry them'
+            ))
+
+    def report(self, done, total, errors, started_at):
+        elapsed = time.monotonic() - started_at
+        self.stdout.write(
+            f'{done}/{total} addresses geocoded, {errors} failed, '
+            f'{done / elapsed if elapsed else 0:.1f} addresses/s'
+        )
+
+    @staticmethod
+    def save_locations(results):
+        now = timezone.now()
+        locations = []
+        for address, coordinates in results:
+            latitude, longitude = coordinates or (None, None)
+            locations.append(Location(
+                address=address,
+                normalized_address=normalize_address(address),
+                latitude=latitude,
+                longitude=longitude,
+                geohash=Location.get_geohash(latitude, longitude),
+                changed_at=now,
+            ))
+        Location.objects.bulk_create(
+            locations,
+            update_conflicts=True,
+            unique_fields=['address'],
+            update_fields=[
+                'normalized_address',
+                'latitude',
+                'longitude',
+                'geohash',
+                'changed_at',
+            ],
+        )
+        locations_resolved.send(
+            sender=Location,
+            addresses=[address for address, _ in results],
+        )
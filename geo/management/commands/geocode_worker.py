@@ -0,0 +1,194 @@
+import asyncio
+import logging
+import time
+from collections import defaultdict
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from geo.backends import get_geocoder
+from geo.client import GEOCODER_ERRORS
+from geo.models import GeocodingTask, Location
+from geo.signals import locations_resolved
+from star_burger import metrics
+
+logger = logging.getLogger(__file__)
+
+metrics.register(
+    'geocoding_tasks_total',
+    'counter',
+    'Geocoding tasks processed by the worker by result',
+)
+
+
+class Command(BaseCommand):
+    help = 'Geocodes the addresses queued by GeocodingTask'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=20,
+            help='how many tasks are claimed at once',
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=10,
+            help='how many geocoder requests are sent at once',
+        )
+        parser.add_argument(
+            '--max-attempts',
+            type=int,
+            default=8,
+            help='failed attempts before a task is marked as dead',
+        )
+        parser.add_argument(
+            '--backoff',
+            type=float,
+            default=5,
+            help='seconds before the first retry, doubled on every retry',
+        )
+        parser.add_argument(
+            '--max-backoff',
+            type=float,
+            default=3600,
+            help='the longest delay between retries in seconds',
+        )
+        parser.add_argument(
+            '--lease',
+            type=float,
+            default=300,
+            help='seconds a claimed task is hidden from other workers',
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=2,
+            help='seconds to sleep when the queue is empty',
+        )
+        parser.add_argument(
+            '--metrics-port',
+            type=int,
+            help='a port to serve the worker metrics on, at /metrics/',
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='process the due tasks and exit',
+        )
+
+    def handle(self, *args, **options):
+        self.options = options
+        if options['metrics_port']:
+            metrics.start_server(options['metrics_port'])
+        while True:
+            processed = self.process_batch()
+            if options['once'] and not processed:
+                return
+            if not processed:
+                time.sleep(options['poll_interval'])
+
+    def process_batch(self):
+        with transaction.atomic():
+            tasks = GeocodingTask.objects.claim(
+                timezone.now(),
+                self.options['batch_size'],
+                timedelta(seconds=self.options['lease']),
+            )
+        if not tasks:
+            return 0
+
+        tasks_by_address = defaultdict(list)
+        for task in tasks:
+            tasks_by_address[task.address].append(task)
+
+        cached_locations = Location.objects.find_cached(tasks_by_address)
+        coordinates_by_address = asyncio.run(self.fetch_coordinates([
+            address for address in tasks_by_address
+            if address not in cached_locations
+        ]))
+        for address, location in cached_locations.items():
+            if location.address != address:
+                coordinates_by_address[address] = location.coordinates
+
+        fresh_addresses = []
+        for address, address_tasks in tasks_by_address.items():
+            if address not in coordinates_by_address:
+                # The location of this very address is fresh
+                fresh_addresses.append(address)
+                self.delete_tasks(address, address_tasks, 'cached')
+                continue
+
+            coordinates = coordinates_by_address[address]
+            if isinstance(coordinates, Exception):
+                self.postpone_tasks(address, address_tasks, coordinates)
+                continue
+
+            try:
+                Location.save_coordinates(address, coordinates)
+            except Exception as error:
+                self.postpone_tasks(address, address_tasks, error)
+                continue
+            self.delete_tasks(
+                address,
+                address_tasks,
+                'cached' if address in cached_locations else 'geocoded',
+            )
+
+        if fresh_addresses:
+            locations_resolved.send(sender=Location, addresses=fresh_addresses)
+        return len(tasks)
+
+    def postpone_tasks(self, address, tasks, error):
+        """Retry the tasks later, so one bad address does not stop others."""
+        for task in tasks:
+            task.postpone(
+                str(error) or repr(error),
+                timezone.now(),
+                self.options['max_attempts'],
+                self.options['backoff'],
+                self.options['max_backoff'],
+            )
+            metrics.inc(
+                'geocoding_tasks_total',
+                result='dead' if task.status == task.DEAD else 'postponed',
+            )
+        if isinstance(error, GEOCODER_ERRORS):
+            self.stderr.write(f'{address}: {error}')
+        else:
+            # Not a geocoder failure, but likely a bug, so keep the traceback
+            logger.error(
+                'The address %s is not geocoded',
+                address,
+                exc_info=error,
+            )
+
+    def delete_tasks(self, address, tasks, result):
+        GeocodingTask.objects.filter(id__in=[task.id for task in tasks])\
+            .delete()
+        metrics.inc('geocoding_tasks_total', len(tasks), result=result)
+        self.stdout.write(f'{address}: {result}')
+
+    async def fetch_coordinates(self, addresses):
+        """Geocode the addresses concurrently.
+
+        Returns coordinates or the raised exception by address.
+        """
+        if not addresses:
+            return {}
+
+        semaphore = asyncio.Semaphore(self.options['concurrency'])
+        geocoder = get_geocoder()
+        async with geocoder.get_async_client() as client:
+            async def fetch(address):
+                async with semaphore:
+                    return await geocoder.afetch_coordinates(client, address)
+
+            results = await asyncio.gather(
+                *map(fetch, addresses),
+                return_exceptions=True,
+            )
+        return dict(zip(addresses, results))
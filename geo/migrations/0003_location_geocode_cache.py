@@ -0,0 +1,49 @@
+# Generated by Django 4.1.5 on 2026-10-18 09:48
+
+from django.db import migrations, models
+
+from geo.addresses import normalize_address
+
+
+def fill_normalized_address(apps, schema_editor):
+    Location = apps.get_model('geo', 'Location')
+    locations = list(Location.objects.only('id', 'address'))
+    for location in locations:
+        location.normalized_address = normalize_address(location.address)
+    Location.objects.bulk_update(
+        locations,
+        ['normalized_address'],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('geo', '0002_add_geocodingtask'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='location',
+            name='normalized_address',
+            field=models.CharField(default='', editable=False, max_length=150, verbose_name='нормализованный адрес'),
+            preserve_default=False,
+        ),
+        migrations.RunPython(fill_normalized_address, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='location',
+            name='normalized_address',
+            field=models.CharField(db_index=True, editable=False, max_length=150, verbose_name='нормализованный адрес'),
+        ),
+        migrations.AlterField(
+            model_name='location',
+            name='latitude',
+            field=models.FloatField(blank=True, help_text='пусто, если геокодер не нашёл адрес', null=True, verbose_name='широта'),
+        ),
+        migrations.AlterField(
+            model_name='location',
+            name='longitude',
+            field=models.FloatField(blank=True, null=True, verbose_name='долгота'),
+        ),
+    ]
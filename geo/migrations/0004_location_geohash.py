@@ -0,0 +1,40 @@
+# Generated by Django 4.1.5 on 2026-10-18 12:05
+
+from django.db import migrations, models
+
+from geo.geohash import encode
+
+
+def fill_geohash(apps, schema_editor):
+    Location = apps.get_model('geo', 'Location')
+    locations = list(
+        Location.objects.filter(
+            latitude__isnull=False,
+            longitude__isnull=False,
+        ).only('id', 'latitude', 'longitude')
+    )
+    for location in locations:
+        location.geohash = encode(location.latitude, location.longitude)
+    Location.objects.bulk_update(locations, ['geohash'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('geo', '0003_location_geocode_cache'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='location',
+            name='geohash',
+            field=models.CharField(blank=True, default='', editable=False, max_length=9, verbose_name='геохеш'),
+            preserve_default=False,
+        ),
+        migrations.RunPython(fill_geohash, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='location',
+            name='geohash',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=9, verbose_name='геохеш'),
+        ),
+    ]
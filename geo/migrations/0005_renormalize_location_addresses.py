@@ -0,0 +1,30 @@
+# Generated by Django 4.1.5 on 2026-10-18 15:20
+
+from django.db import migrations
+
+from geo.addresses import normalize_address
+
+
+def renormalize_addresses(apps, schema_editor):
+    # The keys of house numbers with a letter were equal to the ones
+    # without it, 5г and 5 gave the same key
+    Location = apps.get_model('geo', 'Location')
+    locations = list(Location.objects.only('id', 'address'))
+    for location in locations:
+        location.normalized_address = normalize_address(location.address)
+    Location.objects.bulk_update(
+        locations,
+        ['normalized_address'],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('geo', '0004_location_geohash'),
+    ]
+
+    operations = [
+        migrations.RunPython(renormalize_addresses, migrations.RunPython.noop),
+    ]
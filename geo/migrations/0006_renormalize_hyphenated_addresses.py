@@ -0,0 +1,29 @@
+# Generated by Django 4.1.5 on 2026-10-18 18:40
+
+from django.db import migrations
+
+from geo.addresses import normalize_address
+
+
+def renormalize_addresses(apps, schema_editor):
+    # Hyphens were dropped, so the keys of 5-7 and 57 were equal
+    Location = apps.get_model('geo', 'Location')
+    locations = list(Location.objects.only('id', 'address'))
+    for location in locations:
+        location.normalized_address = normalize_address(location.address)
+    Location.objects.bulk_update(
+        locations,
+        ['normalized_address'],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('geo', '0005_renormalize_location_addresses'),
+    ]
+
+    operations = [
+        migrations.RunPython(renormalize_addresses, migrations.RunPython.noop),
+    ]
@@ -1,6 +1,147 @@
-import requests
+import random
+from datetime import timedelta
+
 from django.conf import settings
 from django.db import models
+from django.db.models import Q
+from django.utils import timezone
+
+from star_burger import metrics
+
+from .addresses import normalize_address
+from .backends import get_geocoder
+from .distances import get_distance_matrix
+from .geohash import (GEOHASH_LENGTH, NEAREST_START_PRECISION, encode,
+                      get_cells, get_covered_radius, get_precision)
+from .signals import locations_resolved
+
+
+metrics.register(
+    'geocode_cache_hits_total',
+    'counter',
+    'Addresses geocoded from saved locations',
+)
+metrics.register(
+    'geocode_cache_misses_total',
+    'counter',
+    'Addresses sent to the geocoder',
+)
+
+
+class LocationQuerySet(models.QuerySet):
+    def found(self):
+        return self.filter(latitude__isnull=False, longitude__isnull=False)
+
+    def fresh(self, now=None):
+        """Locations which may be used instead of asking the geocoder."""
+        now = now or timezone.now()
+        found_since = now - timedelta(seconds=settings.GEOCODE_CACHE_TTL)
+        not_found_since = now - timedelta(
+            seconds=settings.GEOCODE_NOT_FOUND_CACHE_TTL
+        )
+        return self.filter(
+            Q(latitude__isnull=False, changed_at__gte=found_since)
+            | Q(latitude__isnull=True, changed_at__gte=not_found_since)
+        )
+
+    def find_cached(self, addresses):
+        """Return fresh locations by address, matched exactly or normalized.
+
+        A matched location may belong to another spelling of the address.
+        """
+        normalized_addresses = {
+            address: normalize_address(address) for address in addresses
+        }
+        locations = self.fresh().filter(
+            Q(address__in=normalized_addresses)
+            | Q(normalized_address__in=set(
+                filter(None, normalized_addresses.values())
+            ))
+        ).order_by('-changed_at')
+
+        locations_by_address = {}
+        locations_by_normalized_address = {}
+        for location in locations:
+            locations_by_address[location.address] = location
+            locations_by_normalized_address.setdefault(
+                location.normalized_address,
+                location,
+            )
+
+        cached_locations = {}
+        for address, normalized_address in normalized_addresses.items():
+            location = locations_by_address.get(address)
+            if not location and normalized_address:
+                location = locations_by_normalized_address.get(
+                    normalized_address
+                )
+            if location:
+                cached_locations[address] = location
+
+        metrics.inc('geocode_cache_hits_total', len(cached_locations))
+        metrics.inc(
+            'geocode_cache_misses_total',
+            len(normalized_addresses) - len(cached_locations),
+        )
+        return cached_locations
+
+    def restaurants(self):
+        return self.filter(restaurants__isnull=False).distinct()
+
+    def near(self, latitude, longitude, precision):
+        """Found locations in the geohash cell of the point and around it."""
+        if not precision:
+            return self.found()
+        cells_filter = Q()
+        for cell in get_cells(latitude, longitude, precision):
+            cells_filter |= Q(geohash__startswith=cell)
+        return self.found().filter(cells_filter)
+
+    @staticmethod
+    def sort_by_distance(locations, latitude, longitude):
+        """Return the locations nearest first, with `distance` in km set."""
+        locations = list(locations)
+        distances = get_distance_matrix(
+            [(latitude, longitude)],
+            [location.coordinates for location in locations],
+        )[0]
+        for location, distance in zip(locations, distances):
+            location.distance = float(distance)
+        return sorted(locations, key=lambda location: location.distance)
+
+    def within_radius(self, latitude, longitude, radius_km):
+        """Return the locations not farther than radius_km, nearest first."""
+        precision = get_precision(latitude, radius_km)
+        return [
+            location for location in self.sort_by_distance(
+                self.near(latitude, longitude, precision),
+                latitude,
+                longitude,
+            )
+            if location.distance <= radius_km
+        ]
+
+    def nearest(self, latitude, longitude, k=1):
+        """Return the k nearest locations, nearest first.
+
+        The search starts with the cells around the point and moves to
+        larger cells until k locations are found inside the covered radius.
+        """
+        for precision in range(NEAREST_START_PRECISION, -1, -1):
+            locations = self.sort_by_distance(
+                self.near(latitude, longitude, precision),
+                latitude,
+                longitude,
+            )
+            if not precision:
+                break
+            covered_radius = get_covered_radius(latitude, precision)
+            if (
+                len(locations) >= k
+                and locations[k - 1].distance <= covered_radius
+            ):
+                break
+        return locations[:k]
 
 
 class Location(models.Model):
@@ -9,14 +150,38 @@ class Location(models.Model):
         max_length=150,
         unique=True,
     )
+    normalized_address = models.CharField(
+        verbose_name='нормализованный адрес',
+        max_length=150,
+        db_index=True,
+        editable=False,
+    )
 
-    latitude = models.FloatField(verbose_name='широта',)
-    longitude = models.FloatField(verbose_name='долгота',)
+    latitude = models.FloatField(
+        verbose_name='широта',
+        null=True,
+        blank=True,
+        help_text='пусто, если геокодер не нашёл адрес',
+    )
+    longitude = models.FloatField(
+        verbose_name='долгота',
+        null=True,
+        blank=True,
+    )
+    geohash = models.CharField(
+        verbose_name='геохеш',
+        max_length=GEOHASH_LENGTH,
+        db_index=True,
+        blank=True,
+        editable=False,
+    )
     changed_at = models.DateTimeField(
         verbose_name='изменена в',
         auto_now=True,
     )
 
+    objects = LocationQuerySet.as_manager()
+
     class Meta:
         verbose_name = 'локация'
         verbose_name_plural = 'локации'
@@ -24,39 +189,150 @@ class Location(models.Model):
     def __str__(self):
         return f'Локация № {self.id} {self.address}'
 
-    @classmethod
-    def save_location(cls, address):
-        coordinates = cls.fetch_coordinates(
-            settings.YA_API_KEY,
-            address
-        )
-        if coordinates:
-            latitude, longitude = coordinates
-            cls.objects.update_or_create(
-                address=address,
-                defaults={'latitude': latitude, 'longitude': longitude}
-            )
+    def save(self, *args, **kwargs):
+        self.normalized_address = normalize_address(self.address)
+        self.geohash = self.get_geohash(self.latitude, self.longitude)
+        super().save(*args, **kwargs)
 
     @staticmethod
-    def fetch_coordinates(apikey, address):
-        base_url = "https://geocode-maps.yandex.ru/1.x"
-        response = requests.get(base_url,
-                                params={
-                                    "geocode": address,
-                                    "apikey": apikey,
-                                    "format": "json",
-                                })
-        response.raise_for_status()
-        found_response = response.json()['response']
-        found_places = found_response['GeoObjectCollection']['featureMember']
-
-        if not found_places:
+    def get_geohash(latitude, longitude):
+        if latitude is None or longitude is None:
+            return ''
+        return encode(float(latitude), float(longitude))
+
+    @property
+    def coordinates(self):
+        if self.latitude is None or self.longitude is None:
             return None
+        return self.latitude, self.longitude
 
-        most_relevant = found_places[0]
-        lon, lat = most_relevant['GeoObject']['Point']['pos'].split(" ")
-        return lat, lon
+    @classmethod
+    def save_location(cls, address):
+        cached_location = cls.objects.find_cached([address]).get(address)
+        if cached_location:
+            if cached_location.address != address:
+                cls.save_coordinates(address, cached_location.coordinates)
+            else:
+                locations_resolved.send(sender=cls, addresses=[address])
+            return
+
+        coordinates = get_geocoder().fetch_coordinates(address)
+        cls.save_coordinates(address, coordinates)
+
+    @classmethod
+    def save_coordinates(cls, address, coordinates):
+        """Save the coordinates, None is saved as a not found address."""
+        latitude, longitude = coordinates or (None, None)
+        cls.objects.update_or_create(
+            address=address,
+            defaults={'latitude': latitude, 'longitude': longitude}
+        )
+        locations_resolved.send(sender=cls, addresses=[address])
 
     @staticmethod
     def get_distance_from_restaurant(restaurant):
         return restaurant['distance']
+
+
+class GeocodingTaskQuerySet(models.QuerySet):
+    def enqueue(self, addresses):
+        """Ask geo workers to geocode the addresses, once per pending address.
+
+        Call it in the transaction which saves the addresses.
+        """
+        addresses = set(addresses)
+        pending_addresses = set(
+            self.filter(address__in=addresses, status=GeocodingTask.PENDING)
+            .values_list('address', flat=True)
+        )
+        return self.bulk_create([
+            GeocodingTask(address=address)
+            for address in addresses - pending_addresses
+        ])
+
+    def due(self, now):
+        return self.filter(
+            status=GeocodingTask.PENDING,
+            next_attempt_at__lte=now,
+        )
+
+    def claim(self, now, batch_size, lease):
+        """Take due tasks for `lease`, so other workers skip them.
+
+        Must be called inside a transaction.
+        """
+        tasks = list(
+            self.due(now)
+            .select_for_update(skip_locked=True)
+            .order_by('next_attempt_at')[:batch_size]
+        )
+        self.filter(id__in=[task.id for task in tasks]).update(
+            attempts=models.F('attempts') + 1,
+            next_attempt_at=now + lease,
+        )
+        for task in tasks:
+            task.attempts += 1
+        return tasks
+
+
+class GeocodingTask(models.Model):
+    PENDING = 'PE'
+    DEAD = 'DE'
+    STATUS_CHOICES = [
+        (PENDING, 'В очереди'),
+        (DEAD, 'Не удалось'),
+    ]
+
+    address = models.CharField(
+        verbose_name='адрес',
+        max_length=150,
+        db_index=True,
+    )
+    status = models.CharField(
+        verbose_name='статус',
+        max_length=2,
+        choices=STATUS_CHOICES,
+        default=PENDING,
+    )
+    attempts = models.PositiveSmallIntegerField(
+        verbose_name='попыток',
+        default=0,
+    )
+    next_attempt_at = models.DateTimeField(
+        verbose_name='следующая попытка в',
+        default=timezone.now,
+    )
+    last_error = models.TextField(
+        verbose_name='последняя ошибка',
+        blank=True,
+    )
+    created_at = models.DateTimeField(
+        verbose_name='создана в',
+        auto_now_add=True,
+    )
+
+    objects = GeocodingTaskQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = 'задача геокодирования'
+        verbose_name_plural = 'задачи геокодирования'
+        indexes = [
+            models.Index(
+                fields=['status', 'next_attempt_at'],
+                name='geocodingtask_due_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f'Задача № {self.id} {self.address}'
+
+    def postpone(self, error, now, max_attempts, backoff, max_backoff):
+        """Schedule a retry with exponential backoff or give the task up."""
+        self.last_error = error
+        if self.attempts >= max_attempts:
+            self.status = self.DEAD
+        else:
+            delay = min(backoff * 2 ** (self.attempts - 1), max_backoff)
+            delay *= random.uniform(1, 1.25)
+            self.next_attempt_at = now + timedelta(seconds=delay)
+        self.save(update_fields=['last_error', 'status', 'next_attempt_at'])
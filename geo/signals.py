@@ -0,0 +1,5 @@
+from django.dispatch import Signal
+
+# Sent with `addresses` once their locations are saved or found fresh, so
+# the models with these addresses can link the locations
+locations_resolved = Signal()
@@ -1,3 +1,224 @@
-from django.test import TestCase
+import random
+from io import StringIO
+from unittest.mock import patch
 
-# Create your tests here.
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase
+from geopy.distance import distance
+
+from .addresses import normalize_address
+from .backends import BaseGeocoder
+from .distances import get_distance_matrix
+from .models import GeocodingTask, Location
+
+# The sphere differs from the WGS-84 ellipsoid by up to 0.56%
+MAX_DISTANCE_ERROR = 0.006
+
+
+class DistanceMatrixTest(SimpleTestCase):
+    def test_matrix_is_close_to_geodesic_distance(self):
+        generator = random.Random(0)
+        origins = [
+            (generator.uniform(-80, 80), generator.uniform(-180, 180))
+            for _ in range(20)
+        ]
+        destinations = [
+            (generator.uniform(-80, 80), generator.uniform(-180, 180))
+            for _ in range(30)
+        ]
+
+        distances = get_distance_matrix(origins, destinations)
+
+        self.assertEqual(distances.shape, (20, 30))
+        for origin_index, origin in enumerate(origins):
+            for destination_index, destination in enumerate(destinations):
+                expected = distance(origin, destination).km
+                self.assertAlmostEqual(
+                    distances[origin_index, destination_index],
+                    expected,
+                    delta=expected * MAX_DISTANCE_ERROR,
+                )
+
+    def test_worst_case_is_within_the_bound(self):
+        origin, destination = (0, 30), (0.05, 30)
+        expected = distance(origin, destination).km
+        self.assertAlmostEqual(
+            get_distance_matrix([origin], [destination])[0, 0],
+            expected,
+            delta=expected * MAX_DISTANCE_ERROR,
+        )
+
+    def test_empty_matrix(self):
+        self.assertEqual(get_distance_matrix([], [(55.75, 37.62)]).shape,
+                         (0, 1))
+
+
+class NormalizeAddressTest(SimpleTestCase):
+    def test_spellings_of_the_same_address_are_equal(self):
+        self.assertEqual(
+            normalize_address('г. Москва, улица Тверская, дом 1'),
+            normalize_address('москва ул.тверская 1'),
+        )
+        self.assertEqual(
+            normalize_address('Москва, Тверская 10к2'),
+            normalize_address('Москва, Тверская 10 корп. 2'),
+        )
+        self.assertEqual(
+            normalize_address('ул. Ленина 5-А'),
+            normalize_address('ул Ленина 5а'),
+        )
+        self.assertEqual(
+            normalize_address('Ростов-на-Дону, ул. Ленина 1'),
+            normalize_address('Ростов на Дону, ул Ленина 1'),
+        )
+
+    def test_number_range_is_not_joined(self):
+        self.assertNotEqual(
+            normalize_address('ул. Ленина, д. 5-7'),
+            normalize_address('ул. Ленина 57'),
+        )
+
+    def test_building_letter_is_kept(self):
+        self.assertNotEqual(
+            normalize_address('ул. Ленина 5г'),
+            normalize_address('ул. Ленина 5'),
+        )
+        self.assertNotEqual(
+            normalize_address('ул. Ленина 10д'),
+            normalize_address('ул Ленина 10'),
+        )
+        self.assertNotEqual(
+            normalize_address('ул. Ленина 5 г'),
+            normalize_address('ул. Ленина 5'),
+        )
+        self.assertNotEqual(
+            normalize_address('ул. Ленина 5д2'),
+            normalize_address('ул. Ленина 5 2'),
+        )
+
+
+class NearbyLocationsTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        generator = random.Random(0)
+        cities = [(55.75, 37.62), (59.94, 30.31), (0.01, 179.99)]
+        Location.objects.bulk_create([
+            Location(
+                address=f'{index}',
+                normalized_address=f'{index}',
+                latitude=latitude,
+                longitude=longitude,
+                geohash=Location.get_geohash(latitude, longitude),
+            )
+            for index, (latitude, longitude) in enumerate(
+                (
+                    city_latitude + generator.uniform(-0.2, 0.2),
+                    (city_longitude + generator.uniform(-0.3, 0.3) + 180)
+                    % 360 - 180,
+                )
+                for city_latitude, city_longitude in cities
+                for _ in range(100)
+            )
+        ])
+        Location.objects.create(address='не найден')
+        cls.points = [
+            (generator.uniform(54, 61), generator.uniform(29, 39))
+            for _ in range(20)
+        ] + [(0, -179.99), (0.2, 179.9), (57.5, 34)]
+
+    def get_sorted_addresses(self, latitude, longitude):
+        locations = list(Location.objects.found())
+        distances = get_distance_matrix(
+            [(latitude, longitude)],
+            [location.coordinates for location in locations],
+        )[0]
+        return [
+            (locations[index].address, distances[index])
+            for index in distances.argsort()
+        ]
+
+    def test_nearest_is_brute_force_sort(self):
+        for latitude, longitude in self.points:
+            expected = self.get_sorted_addresses(latitude, longitude)[:5]
+            nearest = Location.objects.nearest(latitude, longitude, 5)
+            self.assertEqual(
+                [location.address for location in nearest],
+                [address for address, _ in expected],
+            )
+
+    def test_within_radius_is_brute_force_filter(self):
+        for latitude, longitude in self.points:
+            for radius_km in [0.5, 5, 30, 300]:
+                expected = [
+                    address for address, distance_km
+                    in self.get_sorted_addresses(latitude, longitude)
+                    if distance_km <= radius_km
+                ]
+                locations = Location.objects.within_radius(
+                    latitude,
+                    longitude,
+                    radius_km,
+                )
+                self.assertEqual(
+                    [location.address for location in locations],
+                    expected,
+                )
+
+
+class BrokenGeocoder(BaseGeocoder):
+    def fetch_coordinates(self, address):
+        return self.lookup(address)
+
+    async def afetch_coordinates(self, client, address):
+        return self.lookup(address)
+
+    @staticmethod
+    def lookup(address):
+        if address == 'сломанный':
+            raise ValueError('A bug in the geocoder')
+        return 55.75, 37.62
+
+
+class GeocoderBackendTest(SimpleTestCase):
+    def test_backend_without_async_method_is_not_created(self):
+        class SyncGeocoder(BaseGeocoder):
+            def fetch_coordinates(self, address):
+                return None
+
+        with self.assertRaises(TypeError):
+            SyncGeocoder.from_settings()
+
+
+@patch(
+    'geo.management.commands.geocode_worker.get_geocoder',
+    BrokenGeocoder,
+)
+class GeocodeWorkerTest(TestCase):
+    def run_worker(self, *args):
+        with self.assertLogs(level='ERROR') as logs:
+            call_command(
+                'geocode_worker',
+                '--once',
+                *args,
+                stdout=StringIO(),
+                stderr=StringIO(),
+            )
+        return logs.output
+
+    def test_failed_address_does_not_stop_others(self):
+        GeocodingTask.objects.enqueue(['сломанный', 'рабочий'])
+        logs = self.run_worker()
+
+        self.assertIn('сломанный', logs[0])
+        self.assertTrue(Location.objects.filter(address='рабочий').exists())
+        task = GeocodingTask.objects.get()
+        self.assertEqual(task.address, 'сломанный')
+        self.assertEqual(task.status, GeocodingTask.PENDING)
+        self.assertEqual(task.last_error, 'A bug in the geocoder')
+
+    def test_failed_task_is_dead_after_max_attempts(self):
+        GeocodingTask.objects.enqueue(['сломанный'])
+        self.run_worker('--max-attempts', '1')
+
+        task = GeocodingTask.objects.get()
+        self.assertEqual(task.status, GeocodingTask.DEAD)
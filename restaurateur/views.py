@@ -8,10 +8,10 @@ from django.db.models import Case, Value, When
 from django.shortcuts import redirect, render
 from django.urls import reverse_lazy
 from django.views import View
-from geopy.distance import distance
 
-from foodcartapp.models import (Order, OrderItem, Product, Restaurant,
-                                RestaurantMenuItem)
+from foodcartapp.models import (Order, OrderItem, OrderRestaurantDistance,
+                                Product, Restaurant, RestaurantMenuItem)
+from geo.distances import get_distance_matrix
 from geo.models import Location
 
 
@@ -103,7 +103,9 @@ def view_restaurants(request):
 
 @user_passes_test(is_manager, login_url='restaurateur:login')
 def view_orders(request):
-    orders = Order.objects.get_cost().exclude(status=Order.COMPLETED)\
+    orders = Order.objects.prefetch_related('cooking_restaurant')\
+        .select_related('location')\
+        .exclude(status=Order.COMPLETED)\
         .order_by(
             Case(
                 When(status=Order.UNPROCESSED, then=Value(0)),
@@ -137,28 +139,53 @@ def view_orders(request):
             {'order': order, 'possible_restaurants': possible_restaurants, }
         )
 
-    addresses = set()
+    located_orders_ids = set()
     for order_card in order_cards:
-        if order_card['order'].cooking_restaurant:
+        order = order_card['order']
+        if order.cooking_restaurant:
             continue
         if not order_card['possible_restaurants']:
             continue
-
-        addresses.add(order_card['order'].address)
+        if order.location and order.location.coordinates:
+            located_orders_ids.add(order.id)
+
+    known_distances = {
+        (order_id, restaurant_id): distance_km
+        for order_id, restaurant_id, distance_km in OrderRestaurantDistance
+        .objects.filter(order__in=located_orders_ids)
+        .values_list('order', 'restaurant', 'distance_km')
+    }
+    # The refresh_order_distances command saves the distances missing, for
+    # example, for orders located before the distances were saved; till
+    # then they are calculated here
+    missing_orders = {}
+    missing_restaurants = {}
+    for order_card in order_cards:
+        order = order_card['order']
+        if order.id not in located_orders_ids:
+            continue
         for restaurant in order_card['possible_restaurants']:
-            addresses.add(restaurant['address'])
-
-    locations_catalog = {}
-    locations = Location.objects.filter(address__in=addresses).values(
-        'address',
-        'latitude',
-        'longitude',
-    )
-    for location in locations:
-        locations_catalog[location['address']] = {
-            'latitude': location['latitude'],
-            'longitude': location['longitude'],
-        }
+            if (
+                restaurant['coordinates']
+                and (order.id, restaurant['id']) not in known_distances
+            ):
+                missing_orders[order.id] = order.location.coordinates
+                missing_restaurants[restaurant['id']] = \
+                    restaurant['coordinates']
+
+    if missing_orders:
+        distances = get_distance_matrix(
+            list(missing_orders.values()),
+            list(missing_restaurants.values()),
+        )
+        for order_index, order_id in enumerate(missing_orders):
+            for restaurant_index, restaurant_id in enumerate(
+                missing_restaurants
+            ):
+                known_distances.setdefault(
+                    (order_id, restaurant_id),
+                    float(distances[order_index, restaurant_index]),
+                )
 
     for order_card in order_cards:
         if order_card['order'].cooking_restaurant:
@@ -166,29 +193,13 @@ def view_orders(request):
         if not order_card['possible_restaurants']:
             continue
 
-        order_location = locations_catalog.get(
-            order_card['order'].address, None
-        )
+        order_id = order_card['order'].id
         for restaurant in order_card['possible_restaurants']:
+            distance_km = known_distances.get((order_id, restaurant['id']))
             restaurant['distance'] = sys.maxsize
-            restaurant['distance_error'] = True
-            if not order_location:
-                continue
-
-            restaurant_location = locations_catalog.get(
-                restaurant['address'], None
-            )
-            if not restaurant_location:
-                continue
-
-            distance_km = distance(
-                (order_location['latitude'], order_location['longitude']),
-                (restaurant_location['latitude'],
-                 restaurant_location['longitude'])
-            ).km
-
-            restaurant['distance'] = distance_km
-            restaurant['distance_error'] = False
+            restaurant['distance_error'] = distance_km is None
+            if distance_km is not None:
+                restaurant['distance'] = distance_km
 
         if all(
             restaurant['distance_error']
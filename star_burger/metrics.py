@@ -0,0 +1,100 @@
+"""Process-local metrics rendered in the Prometheus text format.
+
+Every gunicorn worker keeps its own values, so the metrics are labelled
+with the worker pid. Processes without Django views, like the geo worker,
+serve them with start_server().
+"""
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.http import HttpResponse
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+metrics_lock = threading.Lock()
+descriptions = {}
+values = {}
+
+
+def register(name, metric_type, help_text):
+    descriptions[name] = (metric_type, help_text)
+
+
+def get_key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def inc(name, value=1, **labels):
+    key = get_key(name, labels)
+    with metrics_lock:
+        values[key] = values.get(key, 0) + value
+
+
+def set_value(name, value, **labels):
+    with metrics_lock:
+        values[get_key(name, labels)] = value
+
+
+def observe(name, value, **labels):
+    """Add an observation to the summary `name`: its _sum and _count."""
+    sum_key = get_key(f'{name}_sum', labels)
+    count_key = get_key(f'{name}_count', labels)
+    with metrics_lock:
+        values[sum_key] = values.get(sum_key, 0) + value
+        values[count_key] = values.get(count_key, 0) + 1
+
+
+def get_value(name, **labels):
+    return values.get(get_key(name, labels), 0)
+
+
+def format_labels(labels):
+    labels = (('pid', str(os.getpid())), *labels)
+    formatted_labels = ','.join(
+        f'{label}="{value}"' for label, value in labels
+    )
+    return f'{{{formatted_labels}}}'
+
+
+def render():
+    with metrics_lock:
+        current_values = sorted(values.items())
+
+    lines = []
+    for name, (metric_type, help_text) in sorted(descriptions.items()):
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {metric_type}')
+        value_names = {name, f'{name}_sum', f'{name}_count'}
+        for (value_name, labels), value in current_values:
+            if value_name in value_names:
+                lines.append(f'{value_name}{format_labels(labels)} {value}')
+    return '\n'.join(lines) + '\n'
+
+
+def metrics_view(request):
+    return HttpResponse(render(), content_type=CONTENT_TYPE)
+
+
+class MetricsRequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0].rstrip('/') != '/metrics':
+            self.send_error(404)
+            return
+        content = render().encode()
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format, *args):
+        # Scrapes would flood the log of the process
+        pass
+
+
+def start_server(port, host=''):
+    """Serve /metrics/ on the port from a daemon thread."""
+    server = ThreadingHTTPServer((host, port), MetricsRequestHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -34,6 +34,7 @@ ROLLBAR_ON = env.bool('ROLLBAR_ON', False)
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'foodcartapp.middleware.order_admission_middleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -93,6 +94,35 @@ DATABASES = {
     'default': env.dj_db_url("DATABASE_URL")
 }
 
+CACHES = {
+    'default': env.dj_cache_url('CACHE_URL', 'locmem://')
+}
+
+CATALOG_SNAPSHOT_TIMEOUT = env.int('CATALOG_SNAPSHOT_TIMEOUT', 24 * 60 * 60)
+BANNERS_MAX_AGE = env.int('BANNERS_MAX_AGE', 30 * 24 * 60 * 60)
+CATALOG_PUBLISH_ROOT = env.str('CATALOG_PUBLISH_ROOT', '')
+GEOCODER_BACKEND = env.str('GEOCODER_BACKEND', 'geo.backends.YandexGeocoder')
+GEOCODER_FIXTURE = env.str('GEOCODER_FIXTURE', '')
+GEOCODER_LATENCY = env.float('GEOCODER_LATENCY', 0)
+GEOCODER_ERROR_RATE = env.float('GEOCODER_ERROR_RATE', 0)
+GEOCODER_CONNECT_TIMEOUT = env.float('GEOCODER_CONNECT_TIMEOUT', 3.05)
+GEOCODER_READ_TIMEOUT = env.float('GEOCODER_READ_TIMEOUT', 10)
+GEOCODER_RETRIES = env.int('GEOCODER_RETRIES', 2)
+GEOCODER_CIRCUIT_FAILURES = env.int('GEOCODER_CIRCUIT_FAILURES', 5)
+GEOCODER_CIRCUIT_COOLDOWN = env.int('GEOCODER_CIRCUIT_COOLDOWN', 30)
+GEOCODE_CACHE_TTL = env.int('GEOCODE_CACHE_TTL', 30 * 24 * 60 * 60)
+GEOCODE_NOT_FOUND_CACHE_TTL = env.int(
+    'GEOCODE_NOT_FOUND_CACHE_TTL',
+    24 * 60 * 60,
+)
+ORDERS_ADMISSION_PATHS = ['/api/order/', '/api/orders/batch/']
+ORDERS_MAX_IN_FLIGHT = env.int('ORDERS_MAX_IN_FLIGHT', 20)
+ORDERS_RETRY_AFTER = env.int('ORDERS_RETRY_AFTER', 2)
+IDEMPOTENCY_KEY_RETENTION = env.int(
+    'IDEMPOTENCY_KEY_RETENTION',
+    24 * 60 * 60,
+)
+
 pwd_validation_path = 'django.contrib.auth.password_validation'
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -142,7 +172,7 @@ REST_FRAMEWORK = {
     ]
 }
 
-YA_API_KEY = env.str('YA_API_KEY')
+YA_API_KEY = env.str('YA_API_KEY', '')
 
 if ROLLBAR_ON:
     ROLLBAR = {